@@ -7,13 +7,21 @@ import pandas as pd
 from io import BytesIO
 from datetime import datetime, date, time as dt_time, timedelta, timezone
 import calendar
+import base64
 import os
 import json
-from collections import defaultdict, OrderedDict
+import re
+import bisect
+from collections import defaultdict, OrderedDict, deque
 import numpy as np
 import time
 import secrets
-from functools import wraps
+import threading
+import sqlite3
+import pickle
+from contextlib import contextmanager
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
@@ -88,10 +96,13 @@ MARGIN_DATA_FILE = 'margin_data.json'
 TEMP_RESULTS = {}
 
 def cleanup_old_sessions(max_age_hours=1):
-    """오래된 세션 자동 정리 (메모리 누수 방지)"""
+    """오래된 세션 자동 정리 (메모리 누수 방지) - 대기/진행 중인 분류 작업은 남겨 둠"""
     now = datetime.now()
     expired_sessions = []
-    for session_id, data in TEMP_RESULTS.items():
+    for session_id, data in list(TEMP_RESULTS.items()):
+        job = data.get('job')
+        if job and job.get('status') in ('queued', 'running'):
+            continue
         created_at = data.get('created_at')
         if created_at:
             if isinstance(created_at, datetime):
@@ -101,7 +112,7 @@ def cleanup_old_sessions(max_age_hours=1):
             if age_seconds > max_age_hours * 3600:
                 expired_sessions.append(session_id)
     for session_id in expired_sessions:
-        del TEMP_RESULTS[session_id]
+        TEMP_RESULTS.pop(session_id, None)
     if expired_sessions:
         print(f"🧹 만료된 세션 {len(expired_sessions)}개 정리됨")
 
@@ -140,7 +151,15 @@ def save_settings(settings):
     """설정 저장 (기존 방식 유지)"""
     save_settings_to_file(settings)
 
+def get_settings_file_mtime():
+    """설정 파일 수정 시각 (파일이 없으면 None)"""
+    try:
+        return os.path.getmtime(SETTINGS_FILE)
+    except OSError:
+        return None
+
 # 초기 설정 로드
+SETTINGS_FILE_MTIME = get_settings_file_mtime()
 try:
     CURRENT_SETTINGS = load_settings()
     if not CURRENT_SETTINGS:
@@ -166,12 +185,133 @@ except Exception as e:
     print(f"❌ 설정 로드 오류: {e}")
     CURRENT_SETTINGS = None
 
+def get_settings_version(settings):
+    """설정 내용 해시 (설정이 바뀌었는지 판단용)"""
+    import hashlib
+    payload = json.dumps(settings or {}, ensure_ascii=False, sort_keys=True)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # ==================== 원가 마진표 (기존 방식 유지) ====================
 
 MARGIN_DATA = []
+MARGIN_DATA_VERSION = 0  # margin_data.json을 다시 읽을 때마다 증가
+MARGIN_CACHE_TTL_SECONDS = int(os.environ.get('MARGIN_CACHE_TTL', 30))  # DB 변경 여부 재확인 주기
+
+def margin_row_to_item(row):
+    """margin_products DB 행 → 원가 마진표 JSON 형식"""
+    return {
+        'id': row['id'],
+        '상품명': row['상품명'],
+        '인상전 상품가': row.get('인상전_상품가', 0),
+        '인상후 상품가': row.get('인상후_상품가', 0),
+        '물량지원': row.get('물량지원', 1),
+        '프로모션할인률': row.get('프로모션할인률', 0),
+        '장려금률': row.get('장려금률', 0),
+        '배송비': row.get('배송비', 0),
+        '박스비': row.get('박스비', 0),
+        '인상전 총 원가': row.get('인상전_총_원가', 0),
+        '인상후 총 원가': row.get('인상후_총_원가', 0),
+        '인상전 재고': row.get('인상전_재고', ''),
+        '1박스 최대 수량': row.get('박스_최대_수량', ''),
+        '기타사항': row.get('기타사항', '')
+    }
+
+class MarginRepository:
+    """
+    원가 마진표 저장소 - /api/margin과 원가 계산(find_matching_cost)이 같은 데이터를 읽음
+    DB 모드: margin_products를 JSON 형식으로 변환해 메모리에 캐시하고,
+             TTL이 지나면 (행 수, 최대 id, 최근 수정시각)만 조회해서 바뀐 경우에만 다시 읽음
+    파일 모드: margin_data.json (MARGIN_DATA)
+    """
+
+    PAGE_SIZE = 1000  # Supabase 기본 조회 한도
+
+    def __init__(self, ttl=MARGIN_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = None
+        self._db_version = None
+        self._etag = None
+        self._checked_at = 0
+        self._generation = 0
+
+    def invalidate(self):
+        """POST/PUT/DELETE 후 호출 - 다음 조회 때 DB에서 다시 읽음"""
+        with self._lock:
+            self._items = None
+            self._db_version = None
+            self._generation += 1
+
+    def snapshot(self):
+        """(상품 목록, 버전 태그, 출처) - 목록은 읽기 전용으로 사용"""
+        if DB_CONNECTED and supabase:
+            try:
+                items, etag = self._db_snapshot()
+                return items, etag, 'db'
+            except Exception as e:
+                print(f"DB 조회 실패, JSON 폴백: {e}")
+        return MARGIN_DATA, f"file-{MARGIN_DATA_VERSION}", 'file'
+
+    def _db_snapshot(self):
+        with self._lock:
+            if self._items is not None and time.time() - self._checked_at < self.ttl:
+                return self._items, self._etag
+            generation = self._generation
+
+        version = self._fetch_db_version()
+        with self._lock:
+            if self._items is not None and version == self._db_version:
+                self._checked_at = time.time()
+                return self._items, self._etag
+
+        import hashlib
+        items = self._fetch_db_items()
+        etag = f"db-{hashlib.md5(json.dumps(version, default=str).encode('utf-8')).hexdigest()[:16]}"
+        with self._lock:
+            # 읽는 동안 수정이 있었으면 캐시에 넣지 않음 (다음 조회 때 다시 읽음)
+            if generation == self._generation:
+                self._items, self._db_version, self._etag = items, version, etag
+                self._checked_at = time.time()
+        return items, etag
+
+    def _fetch_db_version(self):
+        """변경 감지용 (행 수, 최대 id, 최근 수정시각)"""
+        table = supabase.table('margin_products')
+        latest_id = table.select('id', count='exact').order('id', desc=True).limit(1).execute()
+        latest_update = (
+            supabase.table('margin_products').select('updated_at').not_.is_('updated_at', 'null')
+            .order('updated_at', desc=True).limit(1).execute()
+        )
+        return [
+            latest_id.count,
+            latest_id.data[0]['id'] if latest_id.data else None,
+            latest_update.data[0].get('updated_at') if latest_update.data else None
+        ]
+
+    def _fetch_db_items(self):
+        items = []
+        start = 0
+        while True:
+            response = (
+                supabase.table('margin_products').select('*')
+                .order('상품명').order('id').range(start, start + self.PAGE_SIZE - 1).execute()
+            )
+            rows = response.data or []
+            items.extend(margin_row_to_item(row) for row in rows)
+            if len(rows) < self.PAGE_SIZE:
+                return items
+            start += self.PAGE_SIZE
+
+MARGIN_REPOSITORY = MarginRepository()
+
+def invalidate_margin_cache():
+    """원가 마진표 변경 알림 - 저장소 캐시와 원가 검색 인덱스를 다음 조회 때 다시 만듦"""
+    global MARGIN_DATA_VERSION
+    MARGIN_DATA_VERSION += 1
+    MARGIN_REPOSITORY.invalidate()
 
 def load_margin_data():
     """원가 마진표 데이터 로드 (JSON 파일)"""
@@ -179,6 +319,7 @@ def load_margin_data():
     if os.path.exists(MARGIN_DATA_FILE):
         with open(MARGIN_DATA_FILE, 'r', encoding='utf-8') as f:
             MARGIN_DATA = json.load(f)
+        invalidate_margin_cache()
         print(f"✅ 원가 마진표 로드 완료: {len(MARGIN_DATA)}개 상품")
     else:
         print("⚠️  경고: margin_data.json 파일이 없습니다")
@@ -193,49 +334,156 @@ load_margin_data()
 
 # ==================== 원가 매칭 및 수수료 계산 함수 ====================
 
-def find_matching_cost(product_name):
-    """상품명으로 원가 찾기 (Fuzzy Matching)"""
-    if not product_name or not MARGIN_DATA:
-        return 0
+class MarginIndex:
+    """
+    원가 마진표 검색 인덱스 (find_matching_cost 전용)
+    - 정확 일치: 상품명 dict
+    - 마진표 상품명 ⊂ 주문 상품명: Aho-Corasick (PatternIndex)
+    - 주문 상품명 ⊂ 마진표 상품명, 핵심 단어 검색: 전체 상품명을 이어 붙인 문자열에서 str.find
+    같은 조건이면 마진표 앞쪽 상품이 우선 (기존 선형 탐색과 동일한 결과)
+    """
+
+    SEPARATOR = '\x00'
+
+    def __init__(self, items, version):
+        self.items = items
+        self.version = version
+        self.names = [item.get('상품명', '') for item in items]
+
+        self.exact = {}
+        for i, item in enumerate(items):
+            self.exact.setdefault(item.get('상품명'), i)
 
-    product_name = str(product_name).strip()
+        self.empty_index = None
+        self.patterns = PatternIndex()
+        first_index = {}
+        for i, name in enumerate(self.names):
+            if not isinstance(name, str):
+                continue
+            if not name:
+                if self.empty_index is None:
+                    self.empty_index = i
+            elif name not in first_index:
+                first_index[name] = i
+                self.patterns.add(name, i)
+        self.patterns.build()
+
+        # 상품명 i가 text[starts[i]:starts[i] + len] 위치에 있음
+        self.starts = []
+        offset = 0
+        for name in self.names:
+            self.starts.append(offset)
+            offset += (len(name) if isinstance(name, str) else 0) + 1
+        self.text = self.SEPARATOR.join(name if isinstance(name, str) else '' for name in self.names)
+
+    def _containing(self, needle):
+        """needle을 포함하는 상품 인덱스 (오름차순)"""
+        starts, text = self.starts, self.text
+        pos = text.find(needle)
+        while pos != -1:
+            i = bisect.bisect_right(starts, pos) - 1
+            yield i
+            if i + 1 >= len(starts):
+                break
+            pos = text.find(needle, starts[i + 1])
+
+    def _scan(self, product_name):
+        """인덱스로 처리할 수 없는 입력용 - 기존 선형 탐색"""
+        matches = []
+        for i, margin_name in enumerate(self.names):
+            if margin_name in product_name or product_name in margin_name:
+                matches.append((len(margin_name), -i))
+        if matches:
+            return self.items[-max(matches)[1]]
+        keywords = product_name.split()[:3]
+        for i, margin_name in enumerate(self.names):
+            if len(keywords) >= 2 and all(kw in margin_name for kw in keywords[:2]):
+                return self.items[i]
+        return None
 
-    # 1. 정확히 일치
-    for item in MARGIN_DATA:
-        if item.get('상품명') == product_name:
-            return item.get('인상후_총_원가') or item.get('인상후 총 원가', 0)
+    def match(self, product_name):
+        """주문 상품명에 해당하는 마진표 상품 (없으면 None)"""
+        # 1. 정확히 일치
+        i = self.exact.get(product_name)
+        if i is not None:
+            return self.items[i]
+
+        if not product_name or self.SEPARATOR in product_name:
+            return self._scan(product_name)
+
+        # 2. 포함 검색 (긴 것 우선, 같은 길이면 앞쪽 상품)
+        # 주문 상품명을 포함하는 마진표 상품명은 항상 주문 상품명에 포함되는 것보다 길어서 먼저 확인
+        best = max(((len(self.names[i]), -i) for i in self._containing(product_name)), default=None)
+        if best is None:
+            best = max(((len(self.names[i]), -i) for i in self.patterns.search(product_name)), default=None)
+        if best is None and self.empty_index is not None:
+            best = (0, -self.empty_index)
+        if best is not None:
+            return self.items[-best[1]]
+
+        # 3. 핵심 단어 매칭 (공백 기준 첫 2단어가 모두 포함된 첫 상품)
+        keywords = product_name.split()[:3]
+        if len(keywords) >= 2:
+            for i in self._containing(keywords[0]):
+                if keywords[1] in self.names[i]:
+                    return self.items[i]
+        return None
 
-    # 2. 포함 검색 (긴 것 우선)
-    matches = []
-    for item in MARGIN_DATA:
-        margin_name = item.get('상품명', '')
-        if margin_name in product_name or product_name in margin_name:
-            matches.append((item, len(margin_name)))
+_MARGIN_INDEX = None
+_margin_index_lock = threading.Lock()
+
+def get_margin_index():
+    """현재 원가 마진표 검색 인덱스 (마진표가 바뀌었으면 재구축)"""
+    global _MARGIN_INDEX
+    items, version, _ = MARGIN_REPOSITORY.snapshot()
+    index = _MARGIN_INDEX
+    if index is None or index.version != version or index.items is not items:
+        with _margin_index_lock:
+            index = _MARGIN_INDEX
+            if index is None or index.version != version or index.items is not items:
+                index = MarginIndex(items, version)
+                _MARGIN_INDEX = index
+                _cached_matching_cost.cache_clear()
+    return index
+
+# 상품명/판매처별 조회 결과 LRU (마진표 인덱스·수수료표가 바뀌면 비움)
+@lru_cache(maxsize=4096)
+def _cached_matching_cost(index, product_name):
+    item = index.match(product_name)
+    if item is None:
+        return 0
+    return item.get('인상후_총_원가') or item.get('인상후 총 원가', 0)
 
-    if matches:
-        matches.sort(key=lambda x: x[1], reverse=True)
-        return matches[0][0].get('인상후_총_원가') or matches[0][0].get('인상후 총 원가', 0)
+def find_matching_cost(product_name):
+    """상품명으로 원가 찾기 (Fuzzy Matching) - 정확 일치 → 포함 검색(긴 것 우선) → 핵심 단어"""
+    if not product_name:
+        return 0
+    index = get_margin_index()
+    if not index.items:
+        return 0
+    return _cached_matching_cost(index, str(product_name).strip())
 
-    # 3. 핵심 단어 매칭 (공백 기준 첫 2-3단어)
-    keywords = product_name.split()[:3]
-    for item in MARGIN_DATA:
-        margin_name = item.get('상품명', '')
-        if len(keywords) >= 2 and all(kw in margin_name for kw in keywords[:2]):
-            return item.get('인상후_총_원가') or item.get('인상후 총 원가', 0)
 
-    return 0
+_PLATFORM_FEES_KEY = None
 
+@lru_cache(maxsize=1024)
+def _cached_platform_fee_rate(fees_key, site_name):
+    for platform, rate in fees_key:
+        if platform in site_name:
+            return rate
+    return dict(fees_key)['기타']
 
 def get_platform_fee_rate(site_name):
     """판매처별 수수료율 반환"""
+    global _PLATFORM_FEES_KEY
     if not site_name:
         return PLATFORM_FEES['기타']
 
-    site_name = str(site_name)
-    for platform, rate in PLATFORM_FEES.items():
-        if platform in site_name:
-            return rate
-    return PLATFORM_FEES['기타']
+    fees_key = tuple(PLATFORM_FEES.items())
+    if fees_key != _PLATFORM_FEES_KEY:
+        _cached_platform_fee_rate.cache_clear()
+        _PLATFORM_FEES_KEY = fees_key
+    return _cached_platform_fee_rate(fees_key, str(site_name))
 
 # ==================== 면세 자료 정리 함수 ====================
 
@@ -269,11 +517,8 @@ def process_tax_free_files(files):
             
             file_hashes[file_hash] = file.filename
             
-            from io import BytesIO
-            if file.filename.endswith('.xlsx'):
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl')
-            else:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd')
+            ext = 'xlsx' if file.filename.endswith('.xlsx') else 'xls'
+            df = read_excel_upload(file_content, filename=f"upload.{ext}")
             
             if '과세유형' not in df.columns or '매출인식일' not in df.columns:
                 continue
@@ -389,6 +634,184 @@ def filter_star_delivery(df):
     
     return filtered_df, deleted_count
 
+def find_star_column_index(header):
+    """헤더 행에서 '주의메세지' 컬럼 위치 (없으면 None)"""
+    for i, col in enumerate(header):
+        if '주의' in str(col) and '메' in str(col):
+            return i
+    return None
+
+def filter_star_delivery_rows(rows, target_idx, counts):
+    """
+    행 단위 스타배송 필터 (주의메세지 컬럼 값만 보고 제거 여부 판단, 나머지 셀은 그대로 통과)
+    counts에 원본 행 수('original')와 삭제 수('deleted')를 누적 - pandas처럼 끝부분 빈 행은 제외
+    """
+    pending_blank = []
+    for row in rows:
+        if all(value is None for value in row):
+            pending_blank.append(row)
+            continue
+        if pending_blank:
+            counts['original'] += len(pending_blank)
+            yield from pending_blank
+            pending_blank = []
+
+        counts['original'] += 1
+        value = row[target_idx] if target_idx < len(row) else None
+        if isinstance(value, str) and value.startswith('판매자 스타배송'):
+            counts['deleted'] += 1
+            continue
+        yield row
+
+# ==================== 엑셀 읽기 (업로드 파일) ====================
+
+# 확장자별 엑셀 파서 우선순위 (앞에서부터 시도, 실패하면 다음 엔진으로 폴백)
+EXCEL_READ_ENGINES = {
+    'xlsx': ['calamine', 'openpyxl'],
+    'xls': ['calamine', 'xlrd'],
+}
+
+_ENGINE_MODULES = {'calamine': 'python_calamine', 'openpyxl': 'openpyxl', 'xlrd': 'xlrd'}
+_ENGINE_AVAILABLE = {}
+
+def _excel_engine_available(engine):
+    """엑셀 파서 설치 여부 (한 번만 확인)"""
+    if engine not in _ENGINE_AVAILABLE:
+        import importlib.util
+        _ENGINE_AVAILABLE[engine] = importlib.util.find_spec(_ENGINE_MODULES[engine]) is not None
+    return _ENGINE_AVAILABLE[engine]
+
+def read_excel_upload(file, filename=None, usecols=None, **kwargs):
+    """
+    업로드된 엑셀 읽기 (file: 업로드 파일 객체 또는 bytes)
+    빠른 파서(calamine)가 있으면 우선 사용하고, 없거나 실패하면 기존 엔진(openpyxl/xlrd)으로 자동 폴백
+    usecols로 필요한 컬럼만 읽을 수 있음 (pandas read_excel과 동일한 형식)
+    """
+    filename = filename or getattr(file, 'filename', '') or ''
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'xlsx'
+    engines = [e for e in EXCEL_READ_ENGINES.get(ext, EXCEL_READ_ENGINES['xlsx']) if _excel_engine_available(e)]
+    if not engines:
+        raise ValueError(f"사용 가능한 엑셀 파서가 없습니다 ({ext})")
+
+    content = file if isinstance(file, (bytes, bytearray)) else file.read()
+
+    for engine in engines:
+        try:
+            return pd.read_excel(BytesIO(content), engine=engine, usecols=usecols, **kwargs)
+        except Exception as e:
+            if engine == engines[-1]:
+                raise
+            print(f"⚠️ 엑셀 파서 {engine} 실패, 다음 엔진으로 재시도: {e}")
+
+def _calamine_cell_value(value):
+    """calamine 셀 값 정리 (빈 셀은 None, 정수로 떨어지는 실수는 int - pandas와 동일)"""
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if value == '':
+        return None
+    return value
+
+def _iter_openpyxl_rows(content):
+    from openpyxl import load_workbook
+    wb = load_workbook(BytesIO(content), read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        wb.close()
+
+def _iter_xlrd_rows(content):
+    import xlrd
+    book = xlrd.open_workbook(file_contents=content)
+    sheet = book.sheet_by_index(0)
+    for r in range(sheet.nrows):
+        row = []
+        for cell in sheet.row(r):
+            if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                row.append(None)
+            elif cell.ctype == xlrd.XL_CELL_DATE:
+                row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+            elif cell.ctype == xlrd.XL_CELL_NUMBER:
+                row.append(int(cell.value) if float(cell.value).is_integer() else cell.value)
+            elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                row.append(bool(cell.value))
+            else:
+                row.append(cell.value)
+        yield row
+
+def iter_excel_rows(content, ext='xlsx'):
+    """
+    첫 시트를 행(값 리스트) 단위로 순회 - pandas DataFrame을 거치지 않아 셀 값 타입이 그대로 유지됨
+    calamine이 있으면 우선 사용, 없거나 실패하면 openpyxl(read-only) / xlrd로 폴백 (빈 셀은 None)
+    """
+    if _excel_engine_available('calamine'):
+        try:
+            from python_calamine import CalamineWorkbook
+            sheet = CalamineWorkbook.from_filelike(BytesIO(content)).get_sheet_by_index(0)
+            return ([_calamine_cell_value(value) for value in row] for row in sheet.iter_rows())
+        except Exception as e:
+            print(f"⚠️ 엑셀 파서 calamine 실패, 다음 엔진으로 재시도: {e}")
+    if ext == 'xls':
+        return _iter_xlrd_rows(content)
+    return _iter_openpyxl_rows(content)
+
+# ==================== 엑셀 스트리밍 출력 ====================
+
+EXCEL_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # 8MB 넘으면 임시 파일로 넘김
+EXCEL_WRITE_CHUNK_ROWS = 5000
+
+def _excel_cell_value(value):
+    """엑셀 셀 값 변환 (결측값은 빈 셀)"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def _excel_header_cell(ws, value):
+    """pandas to_excel과 같은 헤더 서식 (굵게, 얇은 테두리, 가운데 정렬)"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    cell = WriteOnlyCell(ws, value=value)
+    thin = Side(style='thin')
+    cell.font = Font(bold=True)
+    cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    cell.alignment = Alignment(horizontal='center', vertical='top')
+    return cell
+
+def write_excel_rows(header, rows, sheet_name='Sheet1'):
+    """
+    헤더와 행(값 리스트) iterable을 write-only 워크북에 순서대로 기록
+    워크북 객체 그래프를 메모리에 만들지 않고, 결과는 일정 크기 이상이면 디스크로 넘어가는 임시 파일로 반환
+    """
+    import tempfile
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    ws.append([_excel_header_cell(ws, col) for col in header])
+
+    for row in rows:
+        ws.append([_excel_cell_value(value) for value in row])
+
+    output = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_SIZE)
+    wb.save(output)
+    output.seek(0)
+    return output
+
+def write_excel_stream(df, sheet_name='Sheet1', columns=None):
+    """DataFrame을 청크 단위로 행 기록 (columns 지정 시 해당 컬럼만, 전체 복사 없음)"""
+    def iter_rows():
+        for start in range(0, len(df), EXCEL_WRITE_CHUNK_ROWS):
+            chunk = df.iloc[start:start + EXCEL_WRITE_CHUNK_ROWS]
+            if columns is not None:
+                chunk = chunk[columns]
+            yield from chunk.itertuples(index=False, name=None)
+
+    header = df.columns if columns is None else columns
+    return write_excel_rows(header, iter_rows(), sheet_name=sheet_name)
+
 # ==================== 기존 라우트 (100% 유지) ====================
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -514,49 +937,99 @@ def get_settings_legacy():
 
 # ==================== 기존 /api/margin 라우트 (유지 + 확장) ====================
 
+# 검색 결과 페이지 크기 (검색어가 있을 때 기본 100개)
+MARGIN_SEARCH_DEFAULT_LIMIT = 100
+MARGIN_SEARCH_MAX_LIMIT = 1000
+
+class MarginSearchIndex:
+    """
+    원가 마진표 상품명 검색 인덱스 (한글은 띄어쓰기 없이 붙여 쓰는 경우가 많아 단어 대신 글자 n-gram 사용)
+    1글자/2글자 n-gram 역색인으로 후보를 추린 뒤 실제 포함 여부를 확인하고,
+    정확 일치 → 앞부분 일치 → 일치 위치 → 짧은 이름 순으로 정렬
+    """
+
+    def __init__(self, items, version):
+        self.items = items
+        self.version = version
+        self.names = [str(item.get('상품명') or '').lower() for item in items]
+        self.postings = defaultdict(list)  # n-gram → 상품 위치 목록 (오름차순)
+        for i, name in enumerate(self.names):
+            for gram in set(name) | self._bigrams(name):
+                self.postings[gram].append(i)
+
+    @staticmethod
+    def _bigrams(text):
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def search(self, query):
+        """query를 포함하는 상품 목록 (순위순)"""
+        query = query.lower()
+        grams = self._bigrams(query) or {query}
+        postings = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+
+        names = self.names
+        matches = [i for i in candidates if query in names[i]]
+        matches.sort(key=lambda i: (names[i] != query, not names[i].startswith(query),
+                                    names[i].find(query), len(names[i]), i))
+        return [self.items[i] for i in matches]
+
+_MARGIN_SEARCH_INDEX = None
+_margin_search_lock = threading.Lock()
+
+def get_margin_search_index(items, version):
+    """저장소 스냅샷에 맞는 검색 인덱스 (마진표가 바뀌었으면 재구축)"""
+    global _MARGIN_SEARCH_INDEX
+    index = _MARGIN_SEARCH_INDEX
+    if index is None or index.version != version or index.items is not items:
+        with _margin_search_lock:
+            index = _MARGIN_SEARCH_INDEX
+            if index is None or index.version != version or index.items is not items:
+                index = MarginSearchIndex(items, version)
+                _MARGIN_SEARCH_INDEX = index
+    return index
+
 @app.route('/api/margin', methods=['GET'])
 @login_required
 def get_margin_data():
-    """원가 마진표 데이터 조회"""
+    """
+    원가 마진표 데이터 조회 (ETag 지원 - 바뀐 게 없으면 304)
+    search: 상품명 검색어 (순위순, 기본 100개씩)
+    limit/offset: 페이지 (검색어 없이 limit도 없으면 전체)
+    """
+    import hashlib
     search = request.args.get('search', '').strip()
-    
-    # DB 모드: Supabase에서 조회
-    if DB_CONNECTED and supabase:
-        try:
-            query = supabase.table('margin_products').select('*')
-            if search:
-                query = query.ilike('상품명', f'%{search}%')
-            response = query.order('상품명').execute()
-            
-            # DB 컬럼명 → JSON 형식 변환
-            data = []
-            for item in response.data:
-                data.append({
-                    'id': item['id'],
-                    '상품명': item['상품명'],
-                    '인상전 상품가': item.get('인상전_상품가', 0),
-                    '인상후 상품가': item.get('인상후_상품가', 0),
-                    '물량지원': item.get('물량지원', 1),
-                    '프로모션할인률': item.get('프로모션할인률', 0),
-                    '장려금률': item.get('장려금률', 0),
-                    '배송비': item.get('배송비', 0),
-                    '박스비': item.get('박스비', 0),
-                    '인상전 총 원가': item.get('인상전_총_원가', 0),
-                    '인상후 총 원가': item.get('인상후_총_원가', 0),
-                    '인상전 재고': item.get('인상전_재고', ''),
-                    '1박스 최대 수량': item.get('박스_최대_수량', ''),
-                    '기타사항': item.get('기타사항', '')
-                })
-            return jsonify({'data': data, 'total': len(data), 'source': 'db'})
-        except Exception as e:
-            print(f"DB 조회 실패, JSON 폴백: {e}")
-    
-    # JSON 모드: 파일에서 조회 (기존 방식)
-    if search:
-        filtered = [item for item in MARGIN_DATA if search.lower() in item['상품명'].lower()]
-        return jsonify({'data': filtered, 'total': len(filtered), 'source': 'file'})
-    
-    return jsonify({'data': MARGIN_DATA, 'total': len(MARGIN_DATA), 'source': 'file'})
+    limit = request.args.get('limit', MARGIN_SEARCH_DEFAULT_LIMIT if search else None)
+    try:
+        limit = min(max(int(limit), 1), MARGIN_SEARCH_MAX_LIMIT) if limit is not None else None
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit와 offset은 정수여야 합니다'}), 400
+    items, version, source = MARGIN_REPOSITORY.snapshot()
+
+    # 검색 조건별로 다른 태그 (헤더는 ASCII만 가능해서 해시 사용)
+    query_key = f"{search}|{limit}|{offset}"
+    etag = f"{version}-{hashlib.md5(query_key.encode('utf-8')).hexdigest()[:8]}" if query_key != '|None|0' else version
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        if search:
+            items = get_margin_search_index(items, version).search(search)
+        page = items[offset:offset + limit] if limit is not None else items[offset:]
+        response = jsonify({
+            'data': page,
+            'total': len(items),
+            'offset': offset,
+            'limit': limit,
+            'source': source
+        })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/margin', methods=['POST'])
 @login_required
@@ -585,6 +1058,7 @@ def create_margin_product():
         }
         
         response = supabase.table('margin_products').insert(new_product).execute()
+        invalidate_margin_cache()
         return jsonify({'success': True, 'data': response.data[0]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -617,6 +1091,7 @@ def update_margin_product(product_id):
         }
         
         response = supabase.table('margin_products').update(update_data).eq('id', product_id).execute()
+        invalidate_margin_cache()
         return jsonify({'success': True, 'data': response.data[0] if response.data else None})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -630,12 +1105,56 @@ def delete_margin_product(product_id):
     
     try:
         supabase.table('margin_products').delete().eq('id', product_id).execute()
+        invalidate_margin_cache()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ==================== 담당자 API (새로 추가) ====================
 
+# 담당자 목록 캐시 (상품 규칙 추가/수정/삭제 시 무효화, 그 외 변경은 TTL 뒤 반영)
+WORKERS_CACHE_TTL_SECONDS = int(os.environ.get('WORKERS_CACHE_TTL', 60))
+_workers_cache = {'data': None, 'loaded_at': 0}
+_workers_cache_lock = threading.Lock()
+
+def invalidate_workers_cache():
+    with _workers_cache_lock:
+        _workers_cache['data'] = None
+
+def fetch_workers_with_product_count():
+    """
+    담당자 목록 + 상품 규칙 수
+    workers_with_product_count 뷰로 한 번에 조회, 뷰가 없으면 담당자/상품 규칙을 한 번씩 조회해서 집계
+    """
+    try:
+        return supabase.table('workers_with_product_count').select('*').order('sort_order').execute().data or []
+    except Exception as e:
+        print(f"⚠️ workers_with_product_count 뷰 조회 실패, 상품 규칙 수 직접 집계: {e}")
+
+    workers = supabase.table('workers').select('*').order('sort_order').execute().data or []
+    counts = defaultdict(int)
+    start = 0
+    while True:
+        page = supabase.table('worker_products').select('worker_id').order('id').range(start, start + 999).execute().data or []
+        for product in page:
+            counts[product['worker_id']] += 1
+        if len(page) < 1000:
+            break
+        start += 1000
+    for worker in workers:
+        worker['product_count'] = counts.get(worker['id'], 0)
+    return workers
+
+def get_cached_workers():
+    with _workers_cache_lock:
+        if _workers_cache['data'] is not None and time.time() - _workers_cache['loaded_at'] < WORKERS_CACHE_TTL_SECONDS:
+            return _workers_cache['data']
+    workers = fetch_workers_with_product_count()
+    with _workers_cache_lock:
+        _workers_cache['data'] = workers
+        _workers_cache['loaded_at'] = time.time()
+    return workers
+
 @app.route('/api/workers', methods=['GET'])
 @login_required
 def get_workers():
@@ -643,14 +1162,7 @@ def get_workers():
     # DB 모드
     if DB_CONNECTED and supabase:
         try:
-            response = supabase.table('workers').select('*').order('sort_order').execute()
-            workers = response.data
-            
-            # 각 담당자별 상품 개수 추가
-            for worker in workers:
-                products_resp = supabase.table('worker_products').select('id').eq('worker_id', worker['id']).execute()
-                worker['product_count'] = len(products_resp.data)
-            
+            workers = get_cached_workers()
             return jsonify({'data': workers, 'source': 'db', 'db_connected': True})
         except Exception as e:
             print(f"담당자 DB 조회 실패: {e}")
@@ -743,6 +1255,7 @@ def create_worker_product(worker_id):
         }
         
         response = supabase.table('worker_products').insert(new_product).execute()
+        invalidate_workers_cache()
         return jsonify({'success': True, 'data': response.data[0]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -765,6 +1278,7 @@ def update_worker_product(worker_id, product_id):
         }
         
         response = supabase.table('worker_products').update(update_data).eq('id', product_id).execute()
+        invalidate_workers_cache()
         return jsonify({'success': True, 'data': response.data[0] if response.data else None})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -778,6 +1292,7 @@ def delete_worker_product(worker_id, product_id):
     
     try:
         supabase.table('worker_products').delete().eq('id', product_id).execute()
+        invalidate_workers_cache()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -810,30 +1325,19 @@ def upload_file():
         return jsonify({'error': '.xls 또는 .xlsx 파일만 가능합니다'}), 400
     
     try:
+        # 헤더 행과 주의메세지 컬럼만 보고 거를 행을 정하고, 나머지 행은 DataFrame 변환 없이 그대로 복사
         ext = file.filename.rsplit('.', 1)[1].lower()
-        if ext == 'xls':
-            df = pd.read_excel(file, engine='xlrd')
-        else:
-            df = pd.read_excel(file, engine='openpyxl')
-        
-        original_count = len(df)
-        
-        target_col = None
-        for col in df.columns:
-            if '주의' in str(col) and '메' in str(col):
-                target_col = col
-                break
+        rows = iter_excel_rows(file.read(), ext)
+        header = next(rows, None) or []
         
-        if target_col is None:
+        target_idx = find_star_column_index(header)
+        if target_idx is None:
             return jsonify({'error': "'주의메세지' 컬럼을 찾을 수 없습니다"}), 400
         
-        mask = df[target_col].astype(str).str.startswith('판매자 스타배송', na=False)
-        df_filtered = df[~mask]
-        deleted_count = original_count - len(df_filtered)
-        
-        output = BytesIO()
-        df_filtered.to_excel(output, index=False, engine='openpyxl')
-        output.seek(0)
+        counts = {'original': 0, 'deleted': 0}
+        output = write_excel_rows(header, filter_star_delivery_rows(rows, target_idx, counts))
+        original_count = counts['original']
+        deleted_count = counts['deleted']
         
         original_name = secure_filename(file.filename).rsplit('.', 1)[0]
         output_filename = f"{original_name}_final.xlsx"
@@ -853,52 +1357,47 @@ def upload_file():
 
 # ==================== 기존 송장 분류 (100% 유지) ====================
 
-@app.route('/classify', methods=['POST'])
-@login_required
-def classify_orders():
-    """송장 분류 - 통계와 함께 결과 반환 + DB 저장"""
-    cleanup_old_sessions()  # 오래된 세션 정리
-    if 'file' not in request.files:
-        return jsonify({'error': '파일이 없습니다'}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': '파일을 선택해주세요'}), 400
-
-    if not allowed_file(file.filename):
-        return jsonify({'error': '.xls 또는 .xlsx 파일만 가능합니다'}), 400
+# 분류 작업 스레드 풀 (큰 파일도 요청 워커를 붙잡지 않도록 백그라운드에서 처리)
+CLASSIFY_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('CLASSIFY_WORKERS', 2)))
 
-    if not CURRENT_SETTINGS:
-        return jsonify({'error': '설정 파일을 먼저 로드해주세요'}), 400
+# 단계별 진행률 (%)
+CLASSIFY_STAGES = {'queued': 0, 'parse': 10, 'analytics': 30, 'classify': 50, 'stats': 90, 'done': 100}
 
-    filter_star = request.form.get('filter_star', 'false').lower() == 'true'
+def _set_classify_stage(job, stage):
+    job['stage'] = stage
+    job['progress'] = CLASSIFY_STAGES[stage]
 
+def run_classify_job(job_id, content, filename, filter_star, collect_analytics):
+    """분류 작업 실행 (백그라운드 스레드) - 결과는 TEMP_RESULTS[job_id]에 저장"""
+    entry = TEMP_RESULTS.get(job_id)
+    if entry is None:
+        # 실행 전에 세션이 정리됨
+        return
+    job = entry['job']
+    job['status'] = 'running'
     try:
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        if ext == 'xls':
-            df = pd.read_excel(file, engine='xlrd')
-        else:
-            df = pd.read_excel(file, engine='openpyxl')
+        _set_classify_stage(job, 'parse')
+        df = read_excel_upload(content, filename=filename)
 
-        # 데이터 분석용 DB 저장 (체크박스로 제어)
-        collect_analytics = request.form.get('collect_analytics', 'false').lower() == 'true'
-        
+        # 데이터 분석용 DB 저장 (체크박스로 제어) - 스풀에 넣고 백그라운드에서 저장
         if DB_CONNECTED and collect_analytics:
+            _set_classify_stage(job, 'analytics')
             try:
-                df_copy = df.copy()
-                saved_count = save_sales_data_to_db(df_copy)
-                print(f"✅ 판매 데이터 {saved_count}건 저장 완료")
+                entry['ingest_id'] = get_analytics_spool().enqueue(df, filename)
             except Exception as e:
                 import traceback
-                print(f"⚠️ 판매 데이터 저장 실패: {e}")
+                print(f"⚠️ 판매 데이터 수집 등록 실패: {e}")
                 traceback.print_exc()
 
+        _set_classify_stage(job, 'classify')
         star_deleted = 0
         if filter_star:
             df, star_deleted = filter_star_delivery(df)
 
-        classifier = OrderClassifierV41(CURRENT_SETTINGS)
+        classifier = get_classifier()
         result_df = classifier.classify_orders_optimized(df)
+
+        _set_classify_stage(job, 'stats')
         stats = classifier.get_classification_stats(result_df)
 
         # 스타배송 필터링 체크한 경우 항상 정보 추가 (0건이어도)
@@ -908,25 +1407,87 @@ def classify_orders():
         else:
             stats['summary']['star_filtered'] = False
 
-        session_id = secrets.token_urlsafe(16)
-        TEMP_RESULTS[session_id] = {
-            'df': result_df,
-            'stats': stats,
+        entry['df'] = result_df
+        entry['stats'] = stats
+        _set_classify_stage(job, 'done')
+        job['status'] = 'done'
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        job['status'] = 'failed'
+        job['error'] = str(e)
+
+@app.route('/classify', methods=['POST'])
+@login_required
+def classify_orders():
+    """송장 분류 - 작업 등록 후 작업 ID 즉시 반환 (진행 상황은 /classify/status/<job_id>)"""
+    cleanup_old_sessions()  # 오래된 세션 정리
+    if 'file' not in request.files:
+        return jsonify({'error': '파일이 없습니다'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': '파일을 선택해주세요'}), 400
+
+    if not allowed_file(file.filename):
+        return jsonify({'error': '.xls 또는 .xlsx 파일만 가능합니다'}), 400
+
+    if not CURRENT_SETTINGS:
+        return jsonify({'error': '설정 파일을 먼저 로드해주세요'}), 400
+
+    filter_star = request.form.get('filter_star', 'false').lower() == 'true'
+    collect_analytics = request.form.get('collect_analytics', 'false').lower() == 'true'
+
+    try:
+        # 작업 ID = 결과 세션 ID (완료 후 /download/<job_id>로 다운로드)
+        job_id = secrets.token_urlsafe(16)
+        TEMP_RESULTS[job_id] = {
+            'job': {'status': 'queued', 'stage': 'queued', 'progress': 0, 'error': None},
             'filename': file.filename,
             'created_at': datetime.now()
         }
+        CLASSIFY_EXECUTOR.submit(
+            run_classify_job, job_id, file.read(), file.filename, filter_star, collect_analytics
+        )
 
         return jsonify({
             'success': True,
-            'session_id': session_id,
-            'stats': stats
-        })
+            'job_id': job_id,
+            'session_id': job_id,
+            'status': 'queued'
+        }), 202
 
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/classify/status/<job_id>')
+@login_required
+def classify_status(job_id):
+    """분류 작업 진행 상황 (parse → analytics → classify → stats → done)"""
+    result = TEMP_RESULTS.get(job_id)
+    if not result or 'job' not in result:
+        return jsonify({'error': '작업을 찾을 수 없습니다'}), 404
+
+    job = result['job']
+    response = {
+        'success': True,
+        'job_id': job_id,
+        'session_id': job_id,
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress']
+    }
+    if result.get('ingest_id'):
+        response['ingest_id'] = result['ingest_id']
+    if job['status'] == 'done':
+        response['stats'] = result['stats']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return jsonify(response)
+
 @app.route('/download/<session_id>')
 @login_required
 def download_result(session_id):
@@ -935,9 +1496,14 @@ def download_result(session_id):
         return jsonify({'error': '결과를 찾을 수 없습니다'}), 404
     
     result = TEMP_RESULTS[session_id]
+    if 'df' not in result:
+        job = result.get('job') or {}
+        if job.get('status') == 'failed':
+            return jsonify({'error': job.get('error') or '분류에 실패했습니다'}), 400
+        return jsonify({'error': '아직 분류 중입니다'}), 409
     df = result['df']
     
-    classifier = OrderClassifierV41(CURRENT_SETTINGS)
+    classifier = get_classifier()
     output = classifier.export_single_sheet(df)
     
     original_name = result['filename'].rsplit('.', 1)[0]
@@ -952,6 +1518,136 @@ def download_result(session_id):
 
 # ==================== 분류 엔진 (원본 100% 유지) ====================
 
+def _categorical_from_unique(codes, values):
+    """고유값 단위로 계산한 문자열을 행 단위 범주형으로 펼치기 (codes: 행별 고유값 번호)"""
+    value_codes, categories = pd.factorize(np.asarray(values, dtype=object))
+    return pd.Categorical.from_codes(value_codes[codes], categories=categories)
+
+
+# 매칭 결과 없음 표시 (캐시에 저장하기 위해 None과 구분)
+NO_MATCH = (None, None)
+
+
+class ClassificationCache:
+    """
+    (설정 버전, 상품명, 주문선택사항, 브랜드) → (담당자, 분류근거) LRU 캐시
+    요청 간 유지되며 설정 버전이 키에 들어가 있어서 다른 버전 설정으로 만든 결과는 쓰이지 않음
+    (이전 버전 항목은 새 항목에 밀려 자연히 제거됨)
+    """
+
+    def __init__(self, max_size=20000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, key):
+        with self._lock:
+            result = self._data.get((version, key))
+            if result is not None:
+                self._data.move_to_end((version, key))
+            return result
+
+    def put(self, version, key, result):
+        with self._lock:
+            self._data[(version, key)] = result
+            self._data.move_to_end((version, key))
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+CLASSIFICATION_CACHE = ClassificationCache()
+
+# 프로세스 공용 분류기 (settings 객체, 설정 해시, 분류기)
+_CLASSIFIER_STATE = (None, None, None)
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """
+    프로세스 공용 분류기 반환
+    설정 파일이 바뀌었으면 다시 읽고, 설정 해시가 바뀐 경우에만 규칙을 새로 컴파일해서 통째로 교체
+    """
+    global CURRENT_SETTINGS, SETTINGS_FILE_MTIME, _CLASSIFIER_STATE
+
+    mtime = get_settings_file_mtime()
+    settings, version, classifier = _CLASSIFIER_STATE
+    if classifier is not None and settings is CURRENT_SETTINGS and mtime == SETTINGS_FILE_MTIME:
+        return classifier
+
+    with _classifier_lock:
+        if mtime != SETTINGS_FILE_MTIME:
+            try:
+                loaded = load_settings()
+                if loaded:
+                    CURRENT_SETTINGS = loaded
+                    print("🔄 설정 파일 변경 감지 - 설정 다시 로드")
+            except Exception as e:
+                print(f"❌ 설정 다시 로드 오류 (기존 설정 유지): {e}")
+            SETTINGS_FILE_MTIME = mtime
+
+        settings, version, classifier = _CLASSIFIER_STATE
+        if classifier is not None and settings is CURRENT_SETTINGS:
+            return classifier
+
+        new_version = get_settings_version(CURRENT_SETTINGS)
+        if classifier is None or new_version != version:
+            classifier = OrderClassifierV41(CURRENT_SETTINGS)
+        _CLASSIFIER_STATE = (CURRENT_SETTINGS, new_version, classifier)
+        return classifier
+
+
+class PatternIndex:
+    """
+    Aho-Corasick 다중 패턴 인덱스
+    문자열을 한 번만 순회해서 포함된 모든 패턴의 값을 찾음
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+    def add(self, pattern, value):
+        """패턴 등록 (build 전에 호출)"""
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(value)
+
+    def build(self):
+        """실패 링크 구성 (BFS)"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_node] = self._goto[fail].get(ch, 0)
+                self._output[next_node] = self._output[next_node] + self._output[self._fail[next_node]]
+
+    def search(self, text):
+        """text에 포함된 모든 패턴의 값 집합 반환"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
 class OrderClassifierV41:
     """
     플레이오토 주문 분류 엔진 v4.1
@@ -965,89 +1661,114 @@ class OrderClassifierV41:
         self.quantity_threshold = settings.get('quantity_threshold', 2)
         self.auto_learn = settings.get('auto_learn', True)
         self.min_confidence = settings.get('min_confidence', 1.0)
+        self.settings_version = get_settings_version(settings)
+
+        # 요청마다 다시 만들지 않도록 규칙/특수 담당자/우선순위를 한 번만 구축
+        self.failed_work = self._get_failed_work_name()
+        self.combined_work = self._get_combined_work_name()
+        self.multiple_work = self._get_multiple_work_name()
+        self.priority_map = {name: i for i, name in enumerate(self.work_order)}
+        self.compiled_rules = self._compile_matching_rules()
+        self.rule_index = self._build_rule_index(self.compiled_rules)
         
     def classify_orders_optimized(self, df):
-        """최적화된 주문 분류 (원본 로직)"""
-        df = df.copy()
-        
-        # 전처리
-        df = self._preprocess_data_optimized(df)
+        """최적화된 주문 분류 (원본 로직, 업로드된 DataFrame은 변경하지 않음)"""
+        # 전처리 (분류에 필요한 컬럼만 별도 작업 프레임으로)
+        work = self._preprocess_data_optimized(df)
         
         # 분류 실패 담당자명 찾기
-        failed_work = self._get_failed_work_name()
+        failed_work = self.failed_work
         
         # 초기값 설정
-        df['담당자'] = failed_work
-        df['분류근거'] = '매칭 없음'
-        df['신뢰도'] = 0.0
+        work['담당자'] = failed_work
+        work['분류근거'] = '매칭 없음'
+        work['신뢰도'] = 0.0
         
         # 1. 합배송 처리 (우선순위 1)
-        if '주문고유번호' in df.columns:
-            order_counts = df['주문고유번호'].value_counts()
+        if '주문고유번호' in work.columns:
+            order_counts = work['주문고유번호'].value_counts()
             multi_orders = order_counts[order_counts >= 2].index
-            is_multi_order = df['주문고유번호'].isin(multi_orders)
+            is_multi_order = work['주문고유번호'].isin(multi_orders)
             
-            combined_work = self._get_combined_work_name()
+            combined_work = self.combined_work
             if combined_work:
-                df.loc[is_multi_order, '담당자'] = combined_work
-                df.loc[is_multi_order, '분류근거'] = '합배송'
-                df.loc[is_multi_order, '신뢰도'] = 1.0
+                work.loc[is_multi_order, '담당자'] = combined_work
+                work.loc[is_multi_order, '분류근거'] = '합배송'
+                work.loc[is_multi_order, '신뢰도'] = 1.0
         
         # 2. 복수주문 처리 (우선순위 2)
-        multiple_work = self._get_multiple_work_name()
+        multiple_work = self.multiple_work
         if multiple_work:
-            is_multiple = (df['주문수량'] >= self.quantity_threshold) & (df['담당자'] == failed_work)
-            df.loc[is_multiple, '담당자'] = multiple_work
-            df.loc[is_multiple, '분류근거'] = '복수주문'
-            df.loc[is_multiple, '신뢰도'] = 1.0
+            is_multiple = (work['주문수량'] >= self.quantity_threshold) & (work['담당자'] == failed_work)
+            work.loc[is_multiple, '담당자'] = multiple_work
+            work.loc[is_multiple, '분류근거'] = '복수주문'
+            work.loc[is_multiple, '신뢰도'] = 1.0
         
         # 3. 상품별 매칭 (미분류만 대상)
-        unmatched_mask = df['담당자'] == failed_work
-        unmatched_indices = df[unmatched_mask].index
+        unmatched_mask = work['담당자'] == failed_work
+        unmatched_indices = work[unmatched_mask].index
         
         if len(unmatched_indices) > 0:
-            compiled_rules = self._compile_matching_rules()
-            self._classify_batch(df, unmatched_indices, compiled_rules)
+            self._classify_batch(work, unmatched_indices, self.compiled_rules)
+        
+        # 4. 결과 정렬 후 원본 컬럼과 합치기 (원본 데이터 복사는 이 한 번뿐)
+        positions = self._get_sorted_positions(work)
+        if positions is None:
+            result = df.copy()
+            positions = slice(None)
+        else:
+            result = df.take(positions).reset_index(drop=True)
         
-        # 4. 결과 정렬
-        df = self._sort_results_optimized(df)
+        for col in work.columns:
+            result[col] = work[col].array[positions]
         
-        return df
+        return result
     
     def _preprocess_data_optimized(self, df):
-        """데이터 전처리"""
+        """데이터 전처리 (분류용 작업 프레임 생성, 원본 df는 그대로 둠)"""
+        work = pd.DataFrame(index=pd.RangeIndex(len(df)))
+        
         # 상품명 처리
         if '상품명' in df.columns:
-            df['상품명'] = df['상품명'].fillna('').astype(str)
+            work['상품명'] = df['상품명'].fillna('').astype(str).to_numpy()
         else:
             raise ValueError("필수 컬럼 '상품명' 없음")
         
         # 주문수량 처리
         if '주문수량' in df.columns:
-            df['주문수량'] = pd.to_numeric(df['주문수량'], errors='coerce').fillna(0).astype(int)
+            work['주문수량'] = pd.to_numeric(df['주문수량'], errors='coerce').fillna(0).astype(int).to_numpy()
         else:
-            df['주문수량'] = 1
+            work['주문수량'] = 1
         
         # 주문선택사항 처리
+        # 같은 상품명이 반복되므로 full_product_name/brand는 고유값만 계산해서 범주형으로 보관
+        name_codes, unique_names = pd.factorize(work['상품명'])
         if '주문선택사항' in df.columns:
-            df['주문선택사항'] = df['주문선택사항'].fillna('').astype(str)
-            df['full_product_name'] = df['상품명'] + ' ' + df['주문선택사항']
+            work['주문선택사항'] = df['주문선택사항'].fillna('').astype(str).to_numpy()
+            pair_codes, unique_pairs = pd.MultiIndex.from_arrays(
+                [work['상품명'], work['주문선택사항']]
+            ).factorize()
+            work['full_product_name'] = _categorical_from_unique(
+                pair_codes, [f"{name} {option}" for name, option in unique_pairs]
+            )
         else:
-            df['주문선택사항'] = ''
-            df['full_product_name'] = df['상품명']
+            work['주문선택사항'] = ''
+            work['full_product_name'] = _categorical_from_unique(name_codes, unique_names)
         
-        # 브랜드 추출
-        df['brand'] = df['상품명'].str.split(n=1, expand=True)[0].fillna('')
+        # 브랜드 추출 (상품명 첫 단어)
+        work['brand'] = _categorical_from_unique(
+            name_codes, [(name.split(None, 1) or [''])[0] for name in unique_names]
+        )
         
         # 주문고유번호 처리
         if '주문고유번호' in df.columns:
-            df['주문고유번호'] = df['주문고유번호'].fillna('').astype(str)
+            work['주문고유번호'] = df['주문고유번호'].fillna('').astype(str).to_numpy()
         elif '주문번호' in df.columns:
-            df['주문고유번호'] = df['주문번호'].fillna('').astype(str)
+            work['주문고유번호'] = df['주문번호'].fillna('').astype(str).to_numpy()
         else:
-            df['주문고유번호'] = np.arange(len(df)).astype(str)
+            work['주문고유번호'] = np.arange(len(df)).astype(str)
         
-        return df
+        return work
     
     def _compile_matching_rules(self):
         """매칭 규칙 컴파일"""
@@ -1066,17 +1787,128 @@ class OrderClassifierV41:
                 })
         return rules
     
+    def _build_rule_index(self, rules):
+        """상품명/브랜드 규칙용 다중 패턴 인덱스 구축"""
+        name_index = PatternIndex()
+        brand_index = PatternIndex()
+        always = []
+
+        for rule_id, rule in enumerate(rules):
+            if rule['product_name'] not in ('All', ''):
+                name_index.add(rule['product_name'], rule_id)
+            elif rule['brand'] and rule['brand'] != 'All':
+                # 상품명 조건이 없는 규칙은 브랜드로 후보 검색
+                brand_index.add(rule['brand'], rule_id)
+            else:
+                always.append(rule_id)
+
+        name_index.build()
+        brand_index.build()
+        return {'name': name_index, 'brand': brand_index, 'always': always}
+
+    def _get_rule_index(self, rules):
+        """규칙 인덱스 (미리 구축한 규칙이면 재사용)"""
+        if rules is self.compiled_rules:
+            return self.rule_index
+        return self._build_rule_index(rules)
+
+    def _find_candidate_rules(self, rule_index, rules, product_name, brand):
+        """상품명 1회 순회로 후보 규칙 검색 후 브랜드 조건 확인 (규칙 순서대로 반환)"""
+        candidates = rule_index['name'].search(product_name)
+        candidates.update(rule_index['brand'].search(brand))
+        candidates.update(rule_index['always'])
+
+        result = []
+        for rule_id in sorted(candidates):
+            rule_brand = rules[rule_id]['brand']
+            if rule_brand and rule_brand != 'All' and rule_brand not in brand:
+                continue
+            result.append(rule_id)
+        return result
+
     def _classify_batch(self, df, indices, rules):
-        """배치 분류"""
-        for idx in indices:
-            row = df.loc[idx]
-            
-            for rule in rules:
-                if self._match_rule(row, rule):
-                    df.at[idx, '담당자'] = rule['work_name']
-                    df.at[idx, '분류근거'] = f"매칭: {rule['brand']} {rule['product_name']}"
-                    df.at[idx, '신뢰도'] = 1.0
-                    break
+        """배치 분류 (고유 (상품명, 주문선택사항, 브랜드) 조합 단위로 1회 매칭 후 전파)"""
+        key_cols = ['상품명', '주문선택사항', 'brand']
+        subset = df.loc[indices, key_cols]
+        if len(subset) == 0 or not rules:
+            return
+
+        key_codes, unique_keys = pd.MultiIndex.from_frame(subset).factorize()
+        unique_keys = list(unique_keys)
+
+        # 요청 간 캐시 확인 (설정 버전별로 따로 저장되므로 설정이 바뀌면 이전 결과는 안 쓰임)
+        version = self.settings_version
+        key_results = [CLASSIFICATION_CACHE.get(version, key) for key in unique_keys]
+        missing = [i for i, result in enumerate(key_results) if result is None]
+
+        if missing:
+            missing_df = pd.DataFrame([unique_keys[i] for i in missing], columns=key_cols)
+            rule_ids = self._match_rule_ids(missing_df, rules)
+            for i, rule_id in zip(missing, rule_ids):
+                if rule_id >= 0:
+                    rule = rules[rule_id]
+                    result = (rule['work_name'], f"매칭: {rule['brand']} {rule['product_name']}")
+                else:
+                    result = NO_MATCH
+                CLASSIFICATION_CACHE.put(version, unique_keys[i], result)
+                key_results[i] = result
+
+        key_works = np.array([result[0] for result in key_results], dtype=object)
+        key_reasons = np.array([result[1] for result in key_results], dtype=object)
+        key_matched = np.array([result is not NO_MATCH for result in key_results], dtype=bool)
+
+        matched = key_matched[key_codes]
+        if not matched.any():
+            return
+
+        matched_codes = key_codes[matched]
+        matched_indices = subset.index[matched]
+        df.loc[matched_indices, '담당자'] = key_works[matched_codes]
+        df.loc[matched_indices, '분류근거'] = key_reasons[matched_codes]
+        df.loc[matched_indices, '신뢰도'] = 1.0
+
+    def _match_rule_ids(self, subset, rules):
+        """행별 매칭 규칙 번호 반환 (인덱스 기반 후보 검색, work_order 상 앞선 규칙 우선, 없으면 -1)"""
+        rule_index = self._get_rule_index(rules)
+
+        # 고유 상품명 단위로 후보 규칙 검색 (브랜드는 상품명에서 파생되므로 함께 결정됨)
+        name_codes, unique_names = pd.factorize(subset['상품명'])
+        first_positions = np.unique(name_codes, return_index=True)[1]
+        unique_brands = subset['brand'].to_numpy()[first_positions]
+        candidates_by_name = [
+            self._find_candidate_rules(rule_index, rules, name, brand)
+            for name, brand in zip(unique_names, unique_brands)
+        ]
+
+        # 첫 후보가 옵션 조건 없는 규칙이면 바로 확정
+        first_rule = np.array([c[0] if c else -1 for c in candidates_by_name], dtype=np.int64)
+        needs_option = np.array(
+            [bool(c) and rules[c[0]]['order_option'] not in ('All', '') for c in candidates_by_name],
+            dtype=bool
+        )
+        rule_ids = first_rule[name_codes]
+
+        # 옵션 조건이 걸린 행만 (상품명, 주문선택사항) 조합별로 후보를 순서대로 확인
+        option_rows = np.flatnonzero(needs_option[name_codes])
+        if len(option_rows) > 0:
+            options = subset['주문선택사항'].to_numpy()
+            resolved = {}
+            for pos in option_rows:
+                key = (name_codes[pos], options[pos])
+                if key not in resolved:
+                    row = {
+                        'brand': unique_brands[key[0]],
+                        '상품명': unique_names[key[0]],
+                        '주문선택사항': key[1]
+                    }
+                    resolved[key] = next(
+                        (rule_id for rule_id in candidates_by_name[key[0]]
+                         if self._match_rule(row, rules[rule_id])),
+                        -1
+                    )
+                rule_ids[pos] = resolved[key]
+
+        return rule_ids
     
     def _match_rule(self, row, rule):
         """규칙 매칭"""
@@ -1097,34 +1929,32 @@ class OrderClassifierV41:
         
         return True
     
-    def _sort_results_optimized(self, df):
-        """결과 정렬"""
-        priority_map = {name: i for i, name in enumerate(self.work_order)}
-        df['priority'] = df['담당자'].map(priority_map)
-        
-        combined_work = self._get_combined_work_name()
-        
-        sorted_groups = []
-        for work_name in self.work_order:
-            work_df = df[df['담당자'] == work_name].copy()
-            
-            if len(work_df) == 0:
+    def _get_sorted_positions(self, df):
+        """결과 정렬 순서 (담당자 우선순위 → 합배송은 주문고유번호, 그 외는 전체 상품명 순)
+        정렬할 행이 없으면 None"""
+        # 담당자를 work_order 기준 범주 코드로 바꿔 한 번에 그룹 위치 계산 (work_order에 없으면 -1 → 제외)
+        worker_codes = pd.Categorical(df['담당자'], categories=self.work_order).codes
+        grouped_positions = np.argsort(worker_codes, kind='stable')
+        group_sizes = np.bincount(worker_codes[worker_codes >= 0], minlength=len(self.work_order))
+        group_starts = np.searchsorted(worker_codes[grouped_positions], 0)
+
+        sorted_positions = []
+        for code, work_name in enumerate(self.work_order):
+            size = group_sizes[code]
+            if size == 0:
                 continue
-            
-            if work_name == combined_work:
-                work_df = work_df.sort_values(['주문고유번호'])
-            else:
-                work_df = work_df.sort_values(['full_product_name'])
-            
-            sorted_groups.append(work_df)
-        
-        if sorted_groups:
-            sorted_df = pd.concat(sorted_groups, ignore_index=True)
-            sorted_df = sorted_df.drop(['priority'], axis=1)
-        else:
-            sorted_df = df
-        
-        return sorted_df
+            positions = grouped_positions[group_starts:group_starts + size]
+            group_starts += size
+
+            # 정렬 키 컬럼만 꺼내 정렬 (DataFrame 복사 없음, 기존과 같은 정렬 방식 → 동일 순서)
+            sort_col = '주문고유번호' if work_name == self.combined_work else 'full_product_name'
+            keys = pd.Series(df[sort_col].to_numpy()[positions])
+            sorted_positions.append(positions[keys.sort_values().index.to_numpy()])
+
+        if not sorted_positions:
+            return None
+
+        return np.concatenate(sorted_positions)
     
     def get_classification_stats(self, df):
         """분류 통계 계산"""
@@ -1135,10 +1965,12 @@ class OrderClassifierV41:
         }
         
         current_row = 1
+
+        # 담당자별 건수를 한 번에 집계
+        worker_counts = df['담당자'].value_counts()
         
         for work_name in self.work_order:
-            work_data = df[df['담당자'] == work_name]
-            count = len(work_data)
+            count = int(worker_counts.get(work_name, 0))
             
             config = self.work_config.get(work_name, {})
             icon = config.get('icon', '📋')
@@ -1160,8 +1992,8 @@ class OrderClassifierV41:
             })
         
         # 요약 통계
-        failed_work = self._get_failed_work_name()
-        unmatched_count = len(df[df['담당자'] == failed_work])
+        failed_work = self.failed_work
+        unmatched_count = int(worker_counts.get(failed_work, 0))
         success_count = total_orders - unmatched_count
         auto_rate = round(success_count / total_orders * 100, 1) if total_orders > 0 else 0
         
@@ -1175,19 +2007,11 @@ class OrderClassifierV41:
         return stats
     
     def export_single_sheet(self, df):
-        """단일 시트 엑셀 내보내기"""
-        output = BytesIO()
-        
-        export_df = df.copy()
+        """단일 시트 엑셀 내보내기 (행 단위 스트리밍 기록)"""
         temp_cols = ['full_product_name', 'brand', 'priority', '담당자', '분류근거', '신뢰도']
-        for col in temp_cols:
-            if col in export_df.columns:
-                export_df = export_df.drop(columns=[col])
-        
-        export_df.to_excel(output, sheet_name='분류결과', index=False, engine='openpyxl')
+        export_cols = [col for col in df.columns if col not in temp_cols]
         
-        output.seek(0)
-        return output
+        return write_excel_stream(df, sheet_name='분류결과', columns=export_cols)
     
     def _get_failed_work_name(self):
         """분류실패 담당자명"""
@@ -2718,15 +3542,82 @@ def generate_arrival_invoice():
 
 # ==================== 박스 재고 관리 API ====================
 
-@app.route('/api/box-inventory', methods=['GET'])
-@login_required
-def get_box_inventory():
-    """박스 재고 목록 조회"""
-    if not DB_CONNECTED:
-        return jsonify({'error': 'DB 연결 필요'}), 400
-    
-    try:
-        response = supabase.table('box_inventory').select('*').order('id').execute()
+# 마지막으로 조회/저장한 박스 재고 (id → 저장 값) - 변경 없는 행은 저장 생략
+# version: 캐시를 채울 때의 (행 수, 최대 id, 최근 수정시각) - 저장 함수가 DB와 비교해서
+#          다르면(다른 곳에서 바뀜) 변경 없다고 본 행도 함께 저장
+_box_inventory_cache = {}
+_box_inventory_cache_state = {'version': None}
+_box_inventory_cache_lock = threading.Lock()
+
+def box_inventory_version_of(rows):
+    """조회한 전체 행 → 변경 감지용 (행 수, 최대 id, 최근 수정시각)"""
+    updated = [row['updated_at'] for row in rows if row.get('updated_at')]
+    return [len(rows), max((row['id'] for row in rows), default=None), max(updated, default=None)]
+
+def box_inventory_record(item):
+    """화면/DB 행 → box_inventory 저장 값 (updated_at 제외)"""
+    return {
+        'name_cj': item.get('name_cj', ''),
+        'name_box4u': item.get('name_box4u', ''),
+        'name_official': item.get('name_official', ''),
+        'spec': item.get('spec', ''),
+        'material': item.get('material', ''),
+        'strength': item.get('strength', ''),
+        'print_type': item.get('print_type', '무지'),
+        'price': int(item.get('price', 0) or 0),
+        'vendor': item.get('vendor', 'CJ'),
+        'moq_pallet': int(item.get('moq_pallet', 0) or 0),
+        'moq_piece': int(item.get('moq_piece', 0) or 0),
+        'stock_cj': float(item.get('stock_cj', 0) or 0),
+        'stock_hyojin': float(item.get('stock_hyojin', 0) or 0),
+        'purpose': item.get('purpose', '')
+    }
+
+def remember_box_inventory(rows, replace=False, version=None):
+    """
+    조회/저장된 행으로 캐시 갱신
+    replace=True면 전체 행으로 교체하고 버전도 행에서 계산, 아니면 version(저장 함수가 돌려준 값)으로 갱신
+    """
+    with _box_inventory_cache_lock:
+        if replace:
+            _box_inventory_cache.clear()
+            version = box_inventory_version_of(rows)
+        _box_inventory_cache_state['version'] = version
+        for row in rows:
+            _box_inventory_cache[row['id']] = box_inventory_record(row)
+
+def split_box_inventory_changes(items):
+    """
+    저장 요청 → (신규 행, 변경된 기존 행, 변경 없어 보이는 기존 행, 캐시 버전)
+    변경 없어 보이는 행은 캐시 기준이라, 저장 함수가 버전을 확인해서 DB가 바뀌었으면 함께 저장
+    """
+    inserts, updates, unchanged = [], [], []
+    with _box_inventory_cache_lock:
+        cached = dict(_box_inventory_cache)
+        version = _box_inventory_cache_state['version']
+    for item in items:
+        record = box_inventory_record(item)
+        item_id = item.get('id')
+        if item_id and str(item_id).isdigit():
+            item_id = int(item_id)
+            if cached.get(item_id) == record:
+                unchanged.append({'id': item_id, **record})
+            else:
+                updates.append({'id': item_id, **record})
+        else:
+            inserts.append(record)
+    return inserts, updates, unchanged, version
+
+@app.route('/api/box-inventory', methods=['GET'])
+@login_required
+def get_box_inventory():
+    """박스 재고 목록 조회"""
+    if not DB_CONNECTED:
+        return jsonify({'error': 'DB 연결 필요'}), 400
+    
+    try:
+        response = supabase.table('box_inventory').select('*').order('id').execute()
+        remember_box_inventory(response.data or [], replace=True)
         return jsonify({'success': True, 'data': response.data})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2735,7 +3626,11 @@ def get_box_inventory():
 @app.route('/api/box-inventory', methods=['POST'])
 @login_required
 def save_box_inventory():
-    """박스 재고 저장 (Upsert)"""
+    """
+    박스 재고 저장 (Upsert)
+    마지막 조회 때와 같은 행은 건너뛰고, 신규/변경 행만 DB 함수(save_box_inventory)로 한 번에 저장
+    (캐시 버전이 DB와 다르면 함수가 건너뛸 행까지 저장)
+    """
     if not DB_CONNECTED:
         return jsonify({'error': 'DB 연결 필요'}), 400
     
@@ -2746,34 +3641,51 @@ def save_box_inventory():
         return jsonify({'error': '저장할 데이터가 없습니다'}), 400
     
     try:
-        saved_count = 0
-        for item in items:
-            record = {
-                'name_cj': item.get('name_cj', ''),
-                'name_box4u': item.get('name_box4u', ''),
-                'name_official': item.get('name_official', ''),
-                'spec': item.get('spec', ''),
-                'material': item.get('material', ''),
-                'strength': item.get('strength', ''),
-                'print_type': item.get('print_type', '무지'),
-                'price': int(item.get('price', 0) or 0),
-                'vendor': item.get('vendor', 'CJ'),
-                'moq_pallet': int(item.get('moq_pallet', 0) or 0),
-                'moq_piece': int(item.get('moq_piece', 0) or 0),
-                'stock_cj': float(item.get('stock_cj', 0) or 0),
-                'stock_hyojin': float(item.get('stock_hyojin', 0) or 0),
-                'purpose': item.get('purpose', ''),
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            
-            item_id = item.get('id')
-            if item_id and str(item_id).isdigit():
-                supabase.table('box_inventory').update(record).eq('id', int(item_id)).execute()
-            else:
-                supabase.table('box_inventory').insert(record).execute()
-            saved_count += 1
-        
-        return jsonify({'success': True, 'message': f'{saved_count}개 항목 저장 완료'})
+        inserts, updates, unchanged, version = split_box_inventory_changes(items)
+
+        try:
+            # 한 번의 호출로 버전 확인 + 수정 + 추가 (버전이 다르면 변경 없어 보이는 행도 저장)
+            response = supabase.rpc('save_box_inventory', {
+                'p_inserts': inserts, 'p_updates': updates,
+                'p_unchanged': unchanged, 'p_expected_version': version
+            }).execute()
+            result = response.data or {}
+            if result.get('stale'):
+                updates, unchanged = updates + unchanged, []
+            remember_box_inventory(result.get('rows') or [], version=result.get('version'))
+        except Exception as e:
+            if not is_missing_db_function(e):
+                raise
+            # 함수가 없으면 버전 확인 없이 전체 저장 - 수정은 아직 있는 행만 한 번에 upsert (삭제된 행은 다시 만들지 않음)
+            print(f"⚠️ save_box_inventory 함수 없음, 일괄 upsert/insert로 저장: {e}")
+            now = datetime.utcnow().isoformat()
+            updates, unchanged = updates + unchanged, []
+            saved_rows = []
+            if updates:
+                existing_ids = set()
+                ids = [record['id'] for record in updates]
+                # 500개씩 나눠서 조회 (Supabase 제한)
+                for i in range(0, len(ids), 500):
+                    response = supabase.table('box_inventory').select('id').in_('id', ids[i:i+500]).execute()
+                    existing_ids.update(row['id'] for row in (response.data or []))
+                rows = [{**record, 'updated_at': now} for record in updates if record['id'] in existing_ids]
+                if rows:
+                    response = supabase.table('box_inventory').upsert(rows, on_conflict='id').execute()
+                    saved_rows.extend(response.data or [])
+            if inserts:
+                response = supabase.table('box_inventory').insert(
+                    [{**record, 'updated_at': now} for record in inserts]
+                ).execute()
+                saved_rows.extend(response.data or [])
+            remember_box_inventory(saved_rows, version=None)
+
+        skipped = len(unchanged)
+        saved_count = len(inserts) + len(updates)
+        if not saved_count:
+            message = '변경된 항목이 없습니다'
+        else:
+            message = f'{saved_count}개 항목 저장 완료' + (f' (변경 없음 {skipped}개)' if skipped else '')
+        return jsonify({'success': True, 'message': message, 'saved': saved_count, 'skipped': skipped})
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -2789,6 +3701,8 @@ def delete_box_inventory(item_id):
     
     try:
         supabase.table('box_inventory').delete().eq('id', item_id).execute()
+        with _box_inventory_cache_lock:
+            _box_inventory_cache.pop(item_id, None)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2796,8 +3710,134 @@ def delete_box_inventory(item_id):
 
 # ==================== 데이터 분석 기능 ====================
 
-def save_sales_data_to_db(df):
-    """엑셀 데이터를 DB에 저장 (배치 처리로 최적화)"""
+# 판매 데이터 컬럼 정규화 (save_sales_data_to_db에서 컬럼 단위로 사용)
+SALES_KOREAN_DATETIME_PATTERN = r'^(\d{4}-\d{2}-\d{2})\s*(오전|오후)\s*(\d{1,2}):(\d{2}):?(\d{2})?'
+SALES_ISO_DATETIME_PATTERN = r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$'
+SALES_ISO_DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}$'
+
+def _sales_object_array(series, mask, values):
+    """mask 위치만 values로 채우고 나머지는 None인 object 배열"""
+    out = np.full(len(series), None, dtype=object)
+    out[mask] = values
+    return out
+
+def _sales_text_column(series):
+    """텍스트 컬럼: 빈 값/0은 None, 나머지는 문자열"""
+    valid = series.notna().to_numpy()
+    values = series.to_numpy(dtype=object)
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        return np.array([str(v) if ok and v else None for v, ok in zip(values, valid)], dtype=object)
+    valid = valid & series.astype(bool).to_numpy()
+    return _sales_object_array(series, valid, series[valid].astype(str).to_numpy(dtype=object))
+
+def _sales_number_column(series, default, as_int=False):
+    """숫자 컬럼: 빈 값은 None, 0/빈 문자열/숫자가 아닌 값은 default"""
+    valid = series.notna().to_numpy()
+    numbers = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        truthy = np.array([bool(v) for v in series.to_numpy(dtype=object)], dtype=bool)
+    else:
+        truthy = numbers != 0
+    usable = valid & truthy & ~np.isnan(numbers)
+    if as_int:
+        converted = np.trunc(numbers[usable]).astype(np.int64).tolist()
+    else:
+        converted = numbers[usable].tolist()
+    out = _sales_object_array(series, valid, default)
+    out[usable] = converted
+    return out
+
+def _sales_map_unique(series, func):
+    """고유 값에 대해서만 func을 계산해서 행 단위 리스트로 (빈 값은 func(None))"""
+    codes, uniques = pd.factorize(series)
+    mapped = [func(value) for value in uniques] + [func(None)]
+    return [mapped[code] for code in codes.tolist()]
+
+def _sales_datetime_value(value):
+    """날짜 값 하나를 ISO 문자열로 (엑셀 datetime, Timestamp, 문자열 모두 처리)"""
+    try:
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        str_value = str(value)
+        if '오전' in str_value or '오후' in str_value:
+            match = re.match(SALES_KOREAN_DATETIME_PATTERN, str_value)
+            if not match:
+                return None
+            hour = int(match.group(3))
+            # 오후이고 12시가 아니면 +12, 오전 12시면 0시로
+            if match.group(2) == '오후' and hour != 12:
+                hour += 12
+            elif match.group(2) == '오전' and hour == 12:
+                hour = 0
+            return f"{match.group(1)}T{hour:02d}:{match.group(4)}:{match.group(5) or '00'}"
+        parsed = pd.to_datetime(value, errors='coerce')
+        return parsed.isoformat() if pd.notna(parsed) else None
+    except Exception as date_err:
+        print(f"날짜 파싱 오류: {date_err}, 원본값: {value}")
+        return None
+
+def _sales_datetime_column(series):
+    """날짜 컬럼: 자주 나오는 형식(datetime, 'YYYY-MM-DD HH:MM:SS', 한국어 오전/오후)은 벡터 연산으로 처리"""
+    valid = series.notna().to_numpy()
+    out = np.full(len(series), None, dtype=object)
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if series.dt.tz is None:
+            fraction = (series.dt.microsecond != 0) | (series.dt.nanosecond != 0)
+            plain = valid & ~fraction.to_numpy()
+            out[plain] = series[plain].dt.strftime('%Y-%m-%dT%H:%M:%S').to_numpy(dtype=object)
+            rest = valid & ~plain
+        else:
+            rest = valid
+        for i in np.flatnonzero(rest):
+            out[i] = series.iat[i].isoformat()
+        return out
+
+    values = series.to_numpy(dtype=object)
+    # 빈 문자열/0 등은 원본 값 그대로 유지
+    falsy = valid & np.array([not v for v in values], dtype=bool)
+    out[falsy] = values[falsy]
+    is_text = valid & ~falsy & np.array([isinstance(v, str) for v in values], dtype=bool)
+    handled = falsy.copy()
+    text = series.where(is_text, '').astype(str)
+
+    korean = is_text & text.str.contains('오전|오후', regex=True).to_numpy()
+    if korean.any():
+        parts = text[korean].str.extract(SALES_KOREAN_DATETIME_PATTERN)
+        hour = pd.to_numeric(parts[2])
+        pm = parts[1] == '오후'
+        hour = hour.where(~(pm & (hour != 12)), hour + 12).where(~(~pm & (hour == 12)), 0)
+        matched = parts[0].notna()
+        converted = (parts[0] + 'T' + hour.fillna(0).astype(np.int64).astype(str).str.zfill(2)
+                     + ':' + parts[3] + ':' + parts[4].fillna('00'))
+        out[korean] = np.where(matched.to_numpy(), converted.to_numpy(dtype=object), None)
+        handled |= korean
+
+    for pattern, fmt in ((SALES_ISO_DATETIME_PATTERN, '%Y-%m-%d %H:%M:%S'), (SALES_ISO_DATE_PATTERN, '%Y-%m-%d')):
+        iso = is_text & text.str.match(pattern).to_numpy() & ~handled
+        if iso.any():
+            # 형식은 정규식으로 확인됐으니 날짜 유효성만 검사하고 문자열은 그대로 ISO로 변환
+            matched = text[iso]
+            parsed = pd.to_datetime(matched, format=fmt, errors='coerce')
+            iso_text = matched.str.slice_replace(10, 11, 'T') if fmt.endswith('%S') else matched + 'T00:00:00'
+            out[iso] = np.where(parsed.notna().to_numpy(), iso_text.to_numpy(dtype=object), None)
+            handled |= iso
+
+    for i in np.flatnonzero(valid & ~handled):
+        out[i] = _sales_datetime_value(values[i])
+    return out
+
+def is_missing_db_function(error):
+    """DB 함수(rpc)가 아직 만들어지지 않아서 난 오류인지 (PostgREST PGRST202 / Postgres 42883)"""
+    return getattr(error, 'code', None) in ('PGRST202', '42883') or 'PGRST202' in str(error)
+
+def save_sales_data_to_db(df, state=None, checkpoint=None):
+    """
+    엑셀 데이터를 DB에 저장 (배치 처리로 최적화)
+    state: 수집 스풀 재시도용 진행 상태 dict - 주어지면 오류를 호출자에게 그대로 올리고,
+           배치 ID와 단계별 진행 여부를 기록해서 재시도해도 같은 데이터가 두 번 반영되지 않게 함
+    checkpoint: state를 저장하는 함수 - 부수효과가 있는 단계가 끝날 때마다 호출 (프로세스가 죽어도 진행 상태 유지)
+    """
     if not DB_CONNECTED or not supabase:
         return 0
 
@@ -2826,15 +3866,25 @@ def save_sales_data_to_db(df):
                 return name
         return None
 
-    batch_id = datetime.now().strftime('%Y%m%d%H%M%S')
-    sales_records = []
-    customer_data = {}  # phone -> {구매자명, 구매자ID, 주문수, 총금액, 선물수, 주소}
+    # 배치 ID: 업로드 시각(화면 표시용 앞 14자리) + 난수 - 같은 초에 시작한 작업끼리도 겹치지 않음
+    # (고객 통계 반영/재시도 시 행 삭제의 기준이라 작업마다 유일해야 함)
+    batch_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(6)}"
+
+    def save_state():
+        if state is not None and checkpoint:
+            checkpoint(state)
+
+    if state is not None and 'batch_id' not in state:
+        state['batch_id'] = batch_id
+        save_state()
+    if state is not None:
+        batch_id = state['batch_id']
     df_cols = df.columns.tolist()
 
     # 디버깅: 엑셀 컬럼 출력
     print(f"📋 엑셀 컬럼 목록: {df_cols}")
 
-    # 매핑된 컬럼 확인
+    # 매핑된 컬럼 확인 (한 번만 찾음)
     mapped_cols = {}
     for target_col, source_cols in column_mapping.items():
         source_col = find_column(df_cols, source_cols)
@@ -2847,111 +3897,122 @@ def save_sales_data_to_db(df):
     if not mapped_cols.get('판매가'):
         print("⚠️ 판매가 컬럼을 찾을 수 없습니다!")
 
-    # 1단계: 판매 데이터 준비 + 고객 데이터 집계 (DB 호출 없음)
-    for _, row in df.iterrows():
-        record = {'upload_batch_id': batch_id}
-
-        for target_col, source_cols in column_mapping.items():
-            source_col = find_column(df_cols, source_cols)
-            if source_col:
-                value = row.get(source_col)
-                if pd.isna(value):
-                    value = None
-                elif target_col in ['판매가', '배송비금액']:
-                    value = float(value) if value else 0
-                elif target_col == '주문수량':
-                    value = int(value) if value else 1
-                elif target_col in ['주문일', '결제일', '수집일']:
-                    if value:
-                        try:
-                            # Excel datetime, Timestamp, 문자열 모두 처리
-                            if isinstance(value, datetime):
-                                value = value.isoformat()
-                            elif hasattr(value, 'isoformat'):
-                                value = value.isoformat()
-                            else:
-                                # 한국어 오전/오후 형식 처리 (예: "2026-01-23 오전 1:58:36")
-                                str_value = str(value)
-                                if '오전' in str_value or '오후' in str_value:
-                                    import re
-                                    # "2026-01-23 오전 1:58:36" 또는 "2026-01-23 오후 1:58:36"
-                                    match = re.match(r'(\d{4}-\d{2}-\d{2})\s*(오전|오후)\s*(\d{1,2}):(\d{2}):?(\d{2})?', str_value)
-                                    if match:
-                                        date_part = match.group(1)
-                                        ampm = match.group(2)
-                                        hour = int(match.group(3))
-                                        minute = match.group(4)
-                                        second = match.group(5) or '00'
-
-                                        # 오후이고 12시가 아니면 +12, 오전 12시면 0시로
-                                        if ampm == '오후' and hour != 12:
-                                            hour += 12
-                                        elif ampm == '오전' and hour == 12:
-                                            hour = 0
-
-                                        value = f"{date_part}T{hour:02d}:{minute}:{second}"
-                                    else:
-                                        value = None
-                                else:
-                                    parsed = pd.to_datetime(value, errors='coerce')
-                                    if pd.notna(parsed):
-                                        value = parsed.isoformat()
-                                    else:
-                                        value = None
-                        except Exception as date_err:
-                            print(f"날짜 파싱 오류: {date_err}, 원본값: {value}")
-                            value = None
-                else:
-                    value = str(value) if value else None
-                record[target_col] = value
-
-        product_name = record.get('상품명', '')
-        selling_price = record.get('판매가', 0) or 0
-        quantity = record.get('주문수량', 1) or 1
-        site_name = record.get('판매사이트명', '')
-
-        cost = find_matching_cost(product_name)
-        fee_rate = get_platform_fee_rate(site_name)
-        fee = selling_price * fee_rate
-        profit = (selling_price - cost - fee) * quantity
-
-        record['원가'] = cost
-        record['수수료'] = round(fee, 2)
-        record['순이익'] = round(profit, 2)
-
-        buyer = (record.get('구매자명') or '').strip()
-        recipient = (record.get('수령자명') or '').strip()
-        record['is_gift'] = buyer != recipient if (buyer and recipient) else False
-
-        # 고객 데이터 집계
-        phone = record.get('구매자휴대폰번호')
-        order_number = record.get('주문번호')
-        if phone:
-            if phone not in customer_data:
-                customer_data[phone] = {
-                    '구매자명': record.get('구매자명'),
-                    '구매자ID': record.get('구매자ID'),
-                    '주문수': 0,
-                    '총금액': 0,
-                    '선물수': 0,
-                    '주소': record.get('배송지주소'),
-                    '주문일': record.get('주문일'),
-                    '처리된_주문번호': set()  # 주문번호 중복 체크용
-                }
-            # 주문번호 기준으로 주문수 카운트 (같은 주문번호는 1회로)
-            if order_number and order_number not in customer_data[phone]['처리된_주문번호']:
-                customer_data[phone]['주문수'] += 1
-                customer_data[phone]['처리된_주문번호'].add(order_number)
-            elif not order_number:
-                # 주문번호가 없는 경우 기존 방식으로 카운트
-                customer_data[phone]['주문수'] += 1
-            # 총금액: 판매가 + 배송비
-            shipping_fee = record.get('배송비금액', 0) or 0
-            customer_data[phone]['총금액'] += selling_price + shipping_fee
-            if record['is_gift']:
-                customer_data[phone]['선물수'] += 1
-
-        sales_records.append(record)
+    # 1단계: 판매 데이터 준비 (컬럼 단위 변환, DB 호출 없음)
+    row_count = len(df)
+    records = {'upload_batch_id': np.full(row_count, batch_id, dtype=object)}
+    for target_col, source_col in mapped_cols.items():
+        if not source_col:
+            continue
+        series = df[source_col].reset_index(drop=True)
+        if target_col in ['판매가', '배송비금액']:
+            records[target_col] = _sales_number_column(series, 0)
+        elif target_col == '주문수량':
+            records[target_col] = _sales_number_column(series, 1, as_int=True)
+        elif target_col in ['주문일', '결제일', '수집일']:
+            records[target_col] = _sales_datetime_column(series)
+        else:
+            records[target_col] = _sales_text_column(series)
+    records = pd.DataFrame(records, dtype=object)
+
+    def numeric(col, default):
+        if col not in records:
+            return np.full(row_count, default, dtype=float)
+        return pd.to_numeric(records[col], errors='coerce').fillna(default).replace(0, default).to_numpy(dtype=float)
+
+    selling_price = numeric('판매가', 0)
+    quantity = numeric('주문수량', 1)
+    shipping_fee = numeric('배송비금액', 0)
+    product_names = records['상품명'] if '상품명' in records else pd.Series([''] * row_count)
+    site_names = records['판매사이트명'] if '판매사이트명' in records else pd.Series([''] * row_count)
+
+    # 원가/수수료율은 파일 안의 고유 상품명·판매처에 대해서만 계산
+    costs = _sales_map_unique(product_names, find_matching_cost)
+    fee = selling_price * np.array(_sales_map_unique(site_names, get_platform_fee_rate), dtype=float)
+    profit = (selling_price - np.array(costs, dtype=float) - fee) * quantity
+
+    records['원가'] = costs
+    records['수수료'] = [round(v, 2) for v in fee.tolist()]
+    records['순이익'] = [round(v, 2) for v in profit.tolist()]
+
+    # 선물 여부: 구매자명과 수령자명이 둘 다 있고 서로 다르면 선물
+    def names(col):
+        if col not in records:
+            return pd.Series([''] * row_count)
+        return records[col].fillna('').astype(str).str.strip()
+
+    buyer, recipient = names('구매자명'), names('수령자명')
+    records['is_gift'] = ((buyer != '') & (recipient != '') & (buyer != recipient)).to_numpy(dtype=bool)
+
+    # 고객 데이터 집계 (휴대폰번호 기준, 이름/주소/주문일은 첫 주문 행 기준)
+    customer_data = {}  # phone -> {구매자명, 구매자ID, 주문수, 총금액, 선물수, 주소}
+    if '구매자휴대폰번호' in records:
+        buyers = pd.DataFrame({
+            'phone': records['구매자휴대폰번호'],
+            'order': records['주문번호'] if '주문번호' in records else None,
+            'amount': selling_price + shipping_fee,
+            'gift': records['is_gift'],
+        })
+        has_phone = buyers['phone'].notna().to_numpy()
+        buyers = buyers[has_phone]
+        first_rows = records[has_phone].drop_duplicates('구매자휴대폰번호')
+        phones = first_rows['구매자휴대폰번호']
+
+        def first_values(col):
+            return first_rows[col].tolist() if col in first_rows else [None] * len(first_rows)
+
+        # 주문번호 기준으로 주문수 카운트 (같은 주문번호는 1회로, 주문번호 없으면 행마다 1회)
+        with_order = buyers['order'].notna()
+        order_counts = (
+            buyers[with_order].drop_duplicates(['phone', 'order']).groupby('phone', sort=False).size()
+            .reindex(phones, fill_value=0)
+            + buyers[~with_order].groupby('phone', sort=False).size().reindex(phones, fill_value=0)
+        )
+        grouped = buyers.groupby('phone', sort=False)
+        amounts = grouped['amount'].sum().reindex(phones)
+        gifts = grouped['gift'].sum().reindex(phones)
+
+        customer_rows = zip(phones.tolist(), first_values('구매자명'), first_values('구매자ID'),
+                            first_values('배송지주소'), first_values('주문일'),
+                            order_counts.tolist(), amounts.tolist(), gifts.tolist())
+        for phone, buyer_name, buyer_id, address, order_date, order_count, amount, gift_count in customer_rows:
+            customer_data[phone] = {
+                '구매자명': buyer_name,
+                '구매자ID': buyer_id,
+                '주문수': int(order_count),
+                '총금액': amount,  # 판매가 + 배송비
+                '선물수': int(gift_count),
+                '주소': address,
+                '주문일': order_date,
+            }
+
+    # 모든 컬럼이 이미 파이썬 값이라 to_dict('records') 대신 컬럼 리스트를 바로 묶음 (박싱 생략)
+    columns = records.columns.tolist()
+    sales_records = [dict(zip(columns, row)) for row in zip(*(records[col].tolist() for col in columns))]
+
+    # 재시도인데 고객 반영이 이미 끝났으면 고객 단계 생략
+    if state is not None and state.get('customers_saved'):
+        customer_data = {}
+
+    # 고객 통계는 DB 함수(apply_customer_batch)로 배치 ID 기준 한 번만 누적 (같은 배치를 다시 반영해도 무시됨)
+    if customer_data:
+        try:
+            payload = [{'휴대폰번호': phone, **data} for phone, data in customer_data.items()]
+            response = supabase.rpc('apply_customer_batch', {'p_batch_id': batch_id, 'p_customers': payload}).execute()
+            if response.data is False:
+                print(f"ℹ️ 배치 {batch_id} 고객 통계는 이미 반영됨")
+            else:
+                print(f"👥 고객 데이터 {len(payload)}건 반영 완료")
+            customer_data = {}
+        except Exception as e:
+            if not is_missing_db_function(e):
+                # 함수는 있는데 실패 (시간 초과 등 - 이미 커밋됐을 수도 있음)
+                # → 누적이 두 번 될 수 있는 대체 경로로 가지 않고, 같은 배치 ID로 다시 시도하게 함
+                print(f"고객 통계 반영 오류: {e}")
+                if state is not None:
+                    raise
+                customer_data = {}
+            else:
+                print(f"⚠️ apply_customer_batch 함수 없음, 조회 후 upsert로 반영: {e}")
 
     # 2단계: 기존 고객 한번에 조회 (1번 쿼리)
     existing_customers = {}
@@ -2963,6 +4024,8 @@ def save_sales_data_to_db(df):
                 existing_customers[c['휴대폰번호']] = c
         except Exception as e:
             print(f"고객 조회 오류: {e}")
+            if state is not None:
+                raise
 
     # 3단계: 고객 데이터 처리 (upsert 방식으로 최적화)
     upsert_customers = []
@@ -3003,9 +4066,29 @@ def save_sales_data_to_db(df):
             print(f"👥 고객 데이터 {len(upsert_customers)}건 upsert 완료")
         except Exception as e:
             print(f"고객 upsert 오류: {e}")
+            if state is not None:
+                raise
+    if state is not None and not state.get('customers_saved'):
+        state['customers_saved'] = True
+        save_state()
 
     # 4단계: 중복 체크 및 판매 데이터 저장
     try:
+        if state is not None and 'sales_saved' in state:
+            # 재시도인데 판매 데이터 저장은 끝났음 - 롤업 반영만 안 됐으면 DB에 저장된 배치 행으로 반영
+            if not state.get('rollups_applied'):
+                SALES_ANALYTICS.invalidate()
+                SALES_ROLLUP_STORE.apply(load_sales_frame(where=lambda q: q.eq('upload_batch_id', batch_id)),
+                                         exclude_batch_id=batch_id)
+                state['rollups_applied'] = True
+                save_state()
+            return state['sales_saved']
+
+        if state is not None and state.get('sales_started'):
+            # 이전 시도가 배치 중간에 실패 - 일부만 저장된 이 배치 행을 지우고 처음부터 다시 저장
+            supabase.table('sales_data').delete().eq('upload_batch_id', batch_id).execute()
+            print(f"🔄 이전 시도에서 일부 저장된 배치 {batch_id} 삭제 후 재저장")
+
         if not sales_records:
             return 0
             
@@ -3044,10 +4127,21 @@ def save_sales_data_to_db(df):
             print(f"   샘플: 상품명={str(sample.get('상품명', 'N/A'))[:30]}, 주문일={sample.get('주문일', 'N/A')}")
         
         # 500건씩 배치 처리
+        if state is not None:
+            state['sales_started'] = True
+            save_state()
         batch_size = 500
         for i in range(0, len(sales_records), batch_size):
             batch = sales_records[i:i+batch_size]
             supabase.table('sales_data').insert(batch).execute()
+        if state is not None:
+            state['sales_saved'] = len(sales_records)
+            save_state()
+        SALES_ANALYTICS.invalidate()
+        SALES_ROLLUP_STORE.apply(build_sales_frame(sales_records), exclude_batch_id=batch_id)
+        if state is not None:
+            state['rollups_applied'] = True
+            save_state()
         
         print(f"✅ 판매 데이터 {len(sales_records)}건 DB 저장 성공!")
         return len(sales_records)
@@ -3055,65 +4149,918 @@ def save_sales_data_to_db(df):
         import traceback
         print(f"❌ 판매 데이터 저장 오류: {e}")
         traceback.print_exc()
+        if state is not None:
+            raise
         return 0
 
 
-@app.route('/api/analytics/summary', methods=['GET'])
+# ==================== 판매 데이터 수집 스풀 (백그라운드 DB 저장) ====================
+
+# 분류 요청은 판매 데이터를 로컬 SQLite 대기열에 넣고 바로 진행, DB 저장은 백그라운드 스레드가 담당
+ANALYTICS_SPOOL_PATH = os.environ.get('ANALYTICS_SPOOL_PATH', 'analytics_spool.db')
+ANALYTICS_MAX_ATTEMPTS = 5
+ANALYTICS_RETRY_BASE_SECONDS = 30  # 재시도 간격: 30초, 60초, 120초, ...
+ANALYTICS_LEASE_SECONDS = 120  # 처리 중 작업 선점 유효시간 - 처리하는 동안 주기적으로 연장, 끊기면 다른 프로세스가 이어받음
+
+class AnalyticsSpool:
+    """판매 데이터 수집 대기열 - 서버가 재시작돼도 저장 안 된 작업이 남아 이어서 처리됨"""
+
+    PUBLIC_COLUMNS = ('id', 'filename', 'row_count', 'status', 'attempts', 'saved_count',
+                      'last_error', 'created_at', 'updated_at')
+
+    def __init__(self, path):
+        self.path = path
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT,
+                    row_count INTEGER DEFAULT 0,
+                    payload BLOB,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    saved_count INTEGER,
+                    last_error TEXT,
+                    state TEXT NOT NULL DEFAULT '{}',
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    lease_expires_at REAL NOT NULL DEFAULT 0,
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            # 이전 버전 대기열 파일이면 컬럼 추가 (처리 중이던 작업은 선점 만료로 취급되어 다시 처리됨)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(ingest_jobs)')}
+            if 'lease_expires_at' not in columns:
+                conn.execute('ALTER TABLE ingest_jobs ADD COLUMN lease_expires_at REAL NOT NULL DEFAULT 0')
+            # 처리 중(running)인 작업은 건드리지 않음 - 다른 워커가 처리 중일 수 있고,
+            # 서버가 내려가서 멈춘 작업은 선점이 만료되면 claim_next가 다시 가져감
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, df, filename):
+        """판매 데이터 작업 등록 후 작업 ID 반환"""
+        now = datetime.now().isoformat()
+        payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            cur = conn.execute(
+                'INSERT INTO ingest_jobs (filename, row_count, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (filename, len(df), payload, now, now)
+            )
+            ingest_id = cur.lastrowid
+        self.start()
+        self._wakeup.set()
+        return ingest_id
+
+    def claim_next(self):
+        """
+        처리할 작업 하나를 running으로 선점 (다른 프로세스와 겹치지 않게 상태 조건부 UPDATE)
+        대기 중인 작업 또는 선점이 만료된 처리 중 작업 (처리하던 프로세스가 죽은 경우)
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM ingest_jobs WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'running' AND lease_expires_at < ?) ORDER BY id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if not row:
+                return None
+            cur = conn.execute(
+                "UPDATE ingest_jobs SET status = 'running', attempts = attempts + 1, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND (status = 'pending' OR (status = 'running' AND lease_expires_at < ?))",
+                (now + ANALYTICS_LEASE_SECONDS, datetime.now().isoformat(), row['id'], now)
+            )
+            if cur.rowcount != 1:
+                return None
+            return conn.execute('SELECT * FROM ingest_jobs WHERE id = ?', (row['id'],)).fetchone()
+
+    def complete(self, ingest_id, saved_count):
+        # 저장 끝난 작업은 payload 비워서 파일 크기 유지
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'done', saved_count = ?, payload = NULL, last_error = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (saved_count, datetime.now().isoformat(), ingest_id)
+            )
+
+    def fail(self, ingest_id, attempts, error, state):
+        """실패 기록 - 최대 횟수 전이면 지수 백오프로 재시도 예약"""
+        if attempts >= ANALYTICS_MAX_ATTEMPTS:
+            status, next_attempt_at = 'failed', 0
+        else:
+            status = 'pending'
+            next_attempt_at = time.time() + ANALYTICS_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE ingest_jobs SET status = ?, last_error = ?, state = ?, next_attempt_at = ?, updated_at = ? '
+                'WHERE id = ?',
+                (status, error, json.dumps(state, ensure_ascii=False), next_attempt_at,
+                 datetime.now().isoformat(), ingest_id)
+            )
+
+    def renew_lease(self, ingest_id):
+        """처리 중인 작업의 선점 연장 (처리 스레드가 살아 있는 동안 주기적으로 호출)"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running'",
+                (time.time() + ANALYTICS_LEASE_SECONDS, ingest_id)
+            )
+
+    def save_state(self, ingest_id, state):
+        """진행 상태만 저장 (저장 단계가 하나 끝날 때마다 호출)"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE ingest_jobs SET state = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(state, ensure_ascii=False), datetime.now().isoformat(), ingest_id)
+            )
+
+    def get(self, ingest_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self.PUBLIC_COLUMNS)}, next_attempt_at FROM ingest_jobs WHERE id = ?",
+                (ingest_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, limit=50):
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(self.PUBLIC_COLUMNS)}, next_attempt_at FROM ingest_jobs ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def has_pending(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM ingest_jobs WHERE status IN ('pending', 'running') LIMIT 1").fetchone()
+        return row is not None
+
+    def _seconds_until_next(self):
+        # 대기 작업의 재시도 시각 또는 다른 프로세스가 처리 중인 작업의 선점 만료 시각 중 가장 이른 것
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at ELSE lease_expires_at END) AS t "
+                "FROM ingest_jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()
+        if not row or row['t'] is None:
+            return None
+        return max(0.0, row['t'] - time.time())
+
+    @staticmethod
+    def _to_dict(row):
+        item = {col: row[col] for col in AnalyticsSpool.PUBLIC_COLUMNS}
+        if row['status'] == 'pending' and row['next_attempt_at']:
+            item['next_attempt_at'] = datetime.fromtimestamp(row['next_attempt_at']).isoformat()
+        return item
+
+    def start(self):
+        """백그라운드 저장 스레드 시작 (이미 돌고 있으면 무시)"""
+        with self._worker_lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='analytics-ingest', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                job = self.claim_next()
+                if job:
+                    self._process(job)
+                    continue
+                wait = self._seconds_until_next()
+            except Exception as e:
+                print(f"⚠️ 판매 데이터 수집 스풀 오류: {e}")
+                wait = ANALYTICS_RETRY_BASE_SECONDS
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _process(self, job):
+        state = json.loads(job['state'] or '{}')
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(ANALYTICS_LEASE_SECONDS / 3):
+                try:
+                    self.renew_lease(job['id'])
+                except Exception as e:
+                    print(f"⚠️ 수집 작업 #{job['id']} 선점 연장 실패: {e}")
+
+        threading.Thread(target=heartbeat, name=f"analytics-lease-{job['id']}", daemon=True).start()
+        try:
+            df = pickle.loads(job['payload'])
+            saved_count = save_sales_data_to_db(
+                df, state=state, checkpoint=lambda current: self.save_state(job['id'], current))
+            self.complete(job['id'], saved_count)
+            print(f"✅ 판매 데이터 {saved_count}건 저장 완료 (수집 작업 #{job['id']})")
+        except Exception as e:
+            print(f"⚠️ 판매 데이터 저장 실패 (수집 작업 #{job['id']}, {job['attempts']}회차): {e}")
+            self.fail(job['id'], job['attempts'], str(e), state)
+        finally:
+            done.set()
+
+_ANALYTICS_SPOOL = None
+_analytics_spool_lock = threading.Lock()
+
+def get_analytics_spool():
+    """수집 스풀 (처음 사용할 때 생성)"""
+    global _ANALYTICS_SPOOL
+    with _analytics_spool_lock:
+        if _ANALYTICS_SPOOL is None:
+            _ANALYTICS_SPOOL = AnalyticsSpool(ANALYTICS_SPOOL_PATH)
+        return _ANALYTICS_SPOOL
+
+def resume_analytics_spool():
+    """서버 시작 시 남아있는 수집 작업 이어서 처리"""
+    if not DB_CONNECTED or not os.path.exists(ANALYTICS_SPOOL_PATH):
+        return
+    try:
+        spool = get_analytics_spool()
+        if spool.has_pending():
+            print("🔄 미처리 판매 데이터 수집 작업 재개")
+            spool.start()
+    except Exception as e:
+        print(f"⚠️ 수집 스풀 재개 실패: {e}")
+
+@app.route('/api/analytics/ingest', methods=['GET'])
 @admin_required
-def get_analytics_summary():
-    """KPI 요약 데이터 (프리셋 또는 커스텀 날짜 범위)"""
+def list_analytics_ingest():
+    """최근 판매 데이터 수집 작업 목록"""
     if not DB_CONNECTED:
         return jsonify({'error': 'DB 연결 필요'}), 400
+    limit = min(int(request.args.get('limit', 50)), 500)
+    return jsonify({'success': True, 'jobs': get_analytics_spool().recent(limit)})
 
-    period = request.args.get('period', 'month')
-    custom_start = request.args.get('start_date')  # YYYY-MM-DD
-    custom_end = request.args.get('end_date')      # YYYY-MM-DD
+@app.route('/api/analytics/ingest/<int:ingest_id>', methods=['GET'])
+@login_required
+def get_analytics_ingest(ingest_id):
+    """판매 데이터 수집 작업 상태 (pending → running → done / failed)"""
+    if not DB_CONNECTED:
+        return jsonify({'error': 'DB 연결 필요'}), 400
+    item = get_analytics_spool().get(ingest_id)
+    if not item:
+        return jsonify({'error': '수집 작업을 찾을 수 없습니다'}), 404
+    return jsonify({'success': True, 'job': item})
+
+
+# ==================== 판매 데이터 분석 스냅샷 ====================
+
+# 분석 API들이 sales_data를 각자 전체 조회하지 않도록, 데이터 버전마다 한 번만 읽어 컬럼 형태로 보관
+SALES_ANALYTICS_COLUMNS = ['id', '판매사이트명', '주문일', '상품명', '주문선택사항', '주문수량', '판매가',
+                           '배송비금액', '순이익', '주문번호', '구매자휴대폰번호', '배송지주소', 'is_gift']
+ANALYTICS_CACHE_TTL_SECONDS = int(os.environ.get('ANALYTICS_CACHE_TTL', 30))  # DB 변경 여부 재확인 주기
+WEEKDAY_NAMES = ['월', '화', '수', '목', '금', '토', '일']
+
+def _parse_order_datetime(value):
+    """주문일 문자열 → datetime (실패하면 None)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except Exception:
+        return None
+
+def _simplify_platform(site):
+    """상품 분석용 플랫폼 간소화"""
+    if '쿠팡' in site:
+        return '쿠팡'
+    if '스마트스토어' in site or '네이버' in site:
+        return '스마트스토어'
+    if '11번가' in site:
+        return '11번가'
+    if 'ESM' in site or 'G마켓' in site or '옥션' in site:
+        return 'ESM'
+    return '기타'
+
+def _address_region(address):
+    """배송지주소 → 지역 (앞 두 단어)"""
+    parts = address.split()
+    if len(parts) >= 2:
+        return f"{parts[0]} {parts[1]}"
+    if len(parts) == 1:
+        return parts[0]
+    return '기타'
+
+def _truthy_text(series):
+    """빈 값(None, '')은 None, 나머지는 그대로인 object 배열"""
+    values = series.to_numpy(dtype=object)
+    return np.array([v if v else None for v in values], dtype=object)
+
+def build_sales_frame(rows):
+    """sales_data 행 목록 → 분석용 DataFrame (표시용 값/파생 컬럼은 여기서 한 번만 계산)"""
+    raw = pd.DataFrame(rows, columns=SALES_ANALYTICS_COLUMNS, dtype=object)
+
+    def number(col, default):
+        values = pd.to_numeric(raw[col], errors='coerce').fillna(default)
+        return values.replace(0, default).to_numpy(dtype=float)
+
+    site = np.array([v or '기타' for v in raw['판매사이트명'].tolist()], dtype=object)
+    product = np.array([v or '알 수 없음' for v in raw['상품명'].tolist()], dtype=object)
+    option = np.array([v or '' for v in raw['주문선택사항'].tolist()], dtype=object)
+    address = np.array([v or '' for v in raw['배송지주소'].tolist()], dtype=object)
+
+    parsed = [_parse_order_datetime(v) for v in raw['주문일'].tolist()]
+    valid_time = np.array([dt is not None for dt in parsed], dtype=bool)
+    # 기간 필터용 UTC 시각 (시간대 없는 값은 UTC로 간주 - DB 비교와 동일)
+    utc_times = [(dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt) if dt else None for dt in parsed]
+
+    frame = pd.DataFrame({
+        'site': pd.Series(site, dtype=object),
+        'product': pd.Series(product, dtype=object),
+        'option': pd.Series(option, dtype=object),
+        'quantity': np.trunc(number('주문수량', 1)).astype(np.int64),
+        'revenue': number('판매가', 0) + number('배송비금액', 0),
+        'profit': number('순이익', 0),
+        'order': pd.Series(_truthy_text(raw['주문번호']), dtype=object),
+        'phone': pd.Series(_truthy_text(raw['구매자휴대폰번호']), dtype=object),
+        'is_gift': np.array([bool(v) for v in raw['is_gift'].tolist()], dtype=bool),
+        'ordered_at': pd.to_datetime(utc_times, errors='coerce'),
+        'sale_date': pd.Series([dt.date().isoformat() if dt else '' for dt in utc_times], dtype=object),  # 롤업 키 (UTC 날짜)
+        'has_time': valid_time,
+        # 요일/시간은 주문일 문자열에 적힌 시각 기준 (기존 분석과 동일)
+        'weekday': np.array([dt.weekday() if dt else -1 for dt in parsed], dtype=np.int8),
+        'hour': np.array([dt.hour if dt else -1 for dt in parsed], dtype=np.int8),
+    })
+    frame['has_order'] = frame['order'].notna()
+
+    # 그룹 키 (고유 값만 계산)
+    def derive(values, func):
+        codes, uniques = pd.factorize(values)
+        return pd.Series(np.array([func(v) for v in uniques], dtype=object)[codes], dtype=object)
+
+    frame['platform_group'] = derive(site, _simplify_platform)
+    frame['region'] = derive(address, _address_region)
+    return add_product_keys(frame)
+
+def add_product_keys(frame):
+    """상품 분석용 키 - product_label(상품 | 옵션), detail_key(상품|옵션|플랫폼)"""
+    products = frame['product'].tolist()
+    options = frame['option'].tolist()
+    frame['product_label'] = pd.Series([f"{p} | {o}" if o else p for p, o in zip(products, options)],
+                                       index=frame.index, dtype=object)
+    frame['detail_key'] = pd.Series(
+        [f"{p}|{o}|{g}" for p, o, g in zip(products, options, frame['platform_group'].tolist())],
+        index=frame.index, dtype=object
+    )
+    return frame
+
+def grouped_order_counts(frame, codes, group_count):
+    """그룹별 주문 수 - 주문번호가 있으면 고유 개수, 없으면 행마다 1건"""
+    has_order = frame['has_order'].to_numpy()
+    counts = np.bincount(codes[~has_order], minlength=group_count)
+    pairs = pd.DataFrame({'group': codes[has_order], 'order': frame['order'].to_numpy()[has_order]})
+    pairs = pairs.drop_duplicates()
+    counts += np.bincount(pairs['group'].to_numpy(dtype=np.int64), minlength=group_count)
+    return counts
+
+def grouped_totals(frame, column):
+    """
+    column 값별 (그룹 목록, 코드, 판매량 합, 매출 합) - 그룹은 처음 나온 순서
+    합계는 bincount로 행 순서대로 더해서 기존 파이썬 누적 합과 같은 값
+    """
+    codes, groups = pd.factorize(frame[column])
+    quantity = np.bincount(codes, weights=frame['quantity'].to_numpy(dtype=float), minlength=len(groups))
+    revenue = np.bincount(codes, weights=frame['revenue'].to_numpy(), minlength=len(groups))
+    return list(groups), codes, quantity.astype(np.int64), revenue
+
+
+class SalesAnalyticsEngine:
+    """
+    sales_data 분석 스냅샷
+    - 처음 조회 때 필요한 컬럼만 읽어서 DataFrame으로 보관
+    - TTL이 지나면 (행 수, 최대 id)만 확인해서 바뀐 경우에만 다시 읽음
+    - 판매 데이터 저장/배치 삭제 후에는 invalidate()로 즉시 무효화
+    """
+
+    def __init__(self, ttl=ANALYTICS_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._frame = None
+        self._version = None
+        self._checked_at = 0
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._frame = None
+            self._version = None
+            self._generation += 1
+
+    def frame(self, start_date=None, end_date=None):
+        """분석용 DataFrame (start_date 이상, end_date 미만 주문일로 필터)"""
+        frame = self._snapshot()
+        if start_date is None and end_date is None:
+            return frame
+        mask = frame['has_time'].to_numpy().copy()
+        ordered_at = frame['ordered_at']
+        if start_date is not None:
+            mask &= (ordered_at >= pd.Timestamp(start_date)).to_numpy()
+        if end_date is not None:
+            mask &= (ordered_at < pd.Timestamp(end_date)).to_numpy()
+        return frame[mask]
+
+    def _snapshot(self):
+        with self._lock:
+            if self._frame is not None and time.time() - self._checked_at < self.ttl:
+                return self._frame
+            generation = self._generation
+
+        version = self._fetch_version()
+        with self._lock:
+            if self._frame is not None and version == self._version:
+                self._checked_at = time.time()
+                return self._frame
+
+        frame = load_sales_frame(workers=SALES_FETCH_WORKERS)
+        with self._lock:
+            # 읽는 동안 저장/삭제가 있었으면 캐시에 넣지 않음
+            if generation == self._generation:
+                self._frame, self._version = frame, version
+                self._checked_at = time.time()
+        return frame
+
+    def _fetch_version(self):
+        """변경 감지용 (행 수, 최대 id)"""
+        response = supabase.table('sales_data').select('id', count='exact').order('id', desc=True).limit(1).execute()
+        return [response.count, response.data[0]['id'] if response.data else None]
+
+SALES_ANALYTICS = SalesAnalyticsEngine()
+
+SALES_FETCH_PAGE_SIZE = 1000  # Supabase(PostgREST) 한 번 응답 한도
+SALES_FETCH_WORKERS = int(os.environ.get('SALES_FETCH_WORKERS', 4))  # 전체 조회 시 id 구간 동시 조회 수
+
+def _sales_id_bounds(columns_query):
+    """조건에 맞는 sales_data의 (최소 id, 최대 id) - 없으면 None"""
+    first = columns_query().order('id').limit(1).execute().data
+    if not first:
+        return None
+    last = columns_query().order('id', desc=True).limit(1).execute().data
+    return first[0]['id'], last[0]['id']
+
+def _iter_sales_segment(columns_query, after_id, before_id, page_size):
+    """id가 after_id 초과, before_id 미만인 구간을 id 키셋으로 페이지 조회"""
+    while True:
+        query = columns_query().gt('id', after_id)
+        if before_id is not None:
+            query = query.lt('id', before_id)
+        page = query.order('id').limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]['id']
+
+def iter_sales_data(columns, where=None, page_size=SALES_FETCH_PAGE_SIZE, workers=1):
+    """
+    sales_data를 id 순서대로 페이지(행 목록) 단위로 조회하는 제너레이터
+    - OFFSET 대신 id 키셋 페이지네이션 (뒤쪽 페이지도 인덱스로 바로 찾음, 응답 한도에 잘리지 않음)
+    - where: 조건을 붙이는 함수 (예: lambda q: q.eq('upload_batch_id', batch_id))
+    - workers > 1이면 id 범위를 나눠 구간별로 동시에 미리 받아 두고, 순서대로 내보냄 (구간마다 최대 2페이지 보관)
+    """
+    select_columns = columns if 'id' in [c.strip() for c in columns.split(',')] else f"id, {columns}"
+
+    def columns_query():
+        query = supabase.table('sales_data').select(select_columns)
+        return where(query) if where else query
+
+    if workers <= 1:
+        yield from _iter_sales_segment(columns_query, 0, None, page_size)
+        return
+
+    bounds = _sales_id_bounds(columns_query)
+    if bounds is None:
+        return
+    low, high = bounds
+    step = max((high - low) // workers + 1, page_size)
+    edges = list(range(low, high + 1, step)) + [high + 1]
+    if len(edges) <= 2:
+        yield from _iter_sales_segment(columns_query, low - 1, high + 1, page_size)
+        return
+
+    import queue
+    stop = threading.Event()
+    done = object()
 
+    def produce(after_id, before_id, out):
+        def offer(item):
+            # 소비 쪽이 중간에 멈추면(stop) 더 넣지 않고 종료
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for page in _iter_sales_segment(columns_query, after_id, before_id, page_size):
+                if not offer(page):
+                    return
+            offer(done)
+        except Exception as e:
+            offer(e)
+
+    queues = [queue.Queue(maxsize=2) for _ in range(len(edges) - 1)]
+    executor = ThreadPoolExecutor(max_workers=len(queues))
     try:
-        today = get_kst_today()
-        start_date = None
-        end_date = None
-        
-        # 커스텀 날짜 범위가 있으면 사용
-        if custom_start:
-            start_date = datetime.strptime(custom_start, '%Y-%m-%d').date()
-        elif period == 'day':
-            start_date = today
-        elif period == 'week':
-            start_date = today - timedelta(days=7)
-        elif period == 'month':
-            start_date = today - timedelta(days=30)
-        elif period == 'quarter':
-            start_date = today - timedelta(days=90)
-        elif period == 'half':
-            start_date = today - timedelta(days=180)
-        elif period == 'year':
-            start_date = today - timedelta(days=365)
-        # period == 'all' 이면 start_date = None
-        
-        if custom_end:
-            end_date = datetime.strptime(custom_end, '%Y-%m-%d').date()
-
-        query = supabase.table('sales_data').select('판매가, 주문수량, 순이익, 주문일, 주문번호, 배송비금액')
+        for i, out in enumerate(queues):
+            executor.submit(produce, edges[i] - 1, edges[i + 1], out)
+        for out in queues:
+            while True:
+                item = out.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+def load_sales_frame(where=None, workers=1):
+    """조건에 맞는 sales_data를 페이지 단위로 받아 분석용 DataFrame으로 (원본 행은 페이지만큼만 메모리에)"""
+    frames = [build_sales_frame(page) for page in iter_sales_data(', '.join(SALES_ANALYTICS_COLUMNS), where, workers=workers)]
+    if not frames:
+        return build_sales_frame([])
+    return pd.concat(frames, ignore_index=True)
+
+def get_request_analytics_frame(default_period='all'):
+    """요청의 period/start_date/end_date로 필터한 분석용 DataFrame"""
+    start_date, end_date = get_analytics_date_range(
+        request.args.get('period', default_period),
+        request.args.get('start_date'),
+        request.args.get('end_date')
+    )
+    return SALES_ANALYTICS.frame(start_date, end_date)
+
+
+# ==================== 판매 데이터 일별 집계 (롤업) ====================
+
+# 대시보드 집계용 롤업 테이블 - 판매 데이터 저장 시 더하고, 배치 삭제 시 빼서 유지
+# 종류: (테이블, 키 컬럼, 합계 컬럼) - sale_date는 주문일의 UTC 날짜 (주문일이 없으면 NULL)
+SALES_ROLLUPS = {
+    'platform': ('sales_rollup_daily_platform', ['sale_date', 'platform'],
+                 ['quantity', 'revenue', 'profit', 'row_count', 'order_count']),
+    'product': ('sales_rollup_daily_product', ['sale_date', 'product', 'option', 'platform_group'],
+                ['quantity', 'revenue', 'row_count']),
+    'hourly': ('sales_rollup_daily_hourly', ['sale_date', 'weekday', 'hour'],
+               ['quantity', 'revenue', 'row_count']),
+    'region': ('sales_rollup_daily_region', ['sale_date', 'region'],
+               ['quantity', 'revenue', 'row_count']),
+}
+# 롤업 키 → 분석 DataFrame 컬럼
+SALES_ROLLUP_SOURCE_COLUMNS = {'platform': 'site'}
+
+def sales_rollup_order_deltas(frame, sign=1, shared_orders=None):
+    """
+    플랫폼 롤업 주문 수 증감 {(날짜, 판매사이트명): 증감} - 날짜는 frame의 sale_date (없으면 '')
+    주문번호가 있는 주문은 (판매사이트명, 주문번호)별로 가장 이른 날짜(날짜가 하나도 없으면 '')에만 1건으로 셈
+    → 여러 날짜 롤업 행을 더해도 같은 주문이 두 번 세어지지 않음 (기간 합계 = 첫 주문 날짜가 기간 안인 주문 수)
+    주문번호가 없는 행은 행마다 그 날짜에 1건
+    shared_orders: DB에 남아 있는 다른 행의 (날짜, 판매사이트명, 주문번호)
+                   - 그 행들까지 합친 주문의 첫 날짜가 바뀐 만큼만 옮김/증감
+    """
+    deltas = defaultdict(int)
+    no_order = frame[~frame['has_order']]
+    for (sale_date, site), count in no_order.groupby(['sale_date', 'site'], sort=False).size().items():
+        deltas[(sale_date, site)] += sign * int(count)
+
+    ordered = frame[frame['has_order']]
+    if ordered.empty:
+        return deltas
+    # 날짜 없는 행('')은 날짜 있는 행보다 뒤로 가게 해서 최솟값 = 가장 이른 날짜
+    no_date = '\uffff'
+    dates = ordered['sale_date'].where(ordered['sale_date'] != '', no_date)
+    firsts = dates.groupby([ordered['site'], ordered['order']], sort=False).min()
+
+    others = defaultdict(set)
+    for sale_date, site, order in (shared_orders or ()):
+        others[(site, order)].add(sale_date or no_date)
+
+    for (site, order), first in firsts.items():
+        other_dates = others.get((site, order))
+        if not other_dates:
+            deltas[('' if first == no_date else first, site)] += sign
+            continue
+        # 다른 행만 있을 때의 첫 날짜 vs 이 행들까지 합친 첫 날짜 (저장이면 앞쪽, 삭제면 뒤쪽이 현재 상태)
+        other_first = min(other_dates)
+        combined_first = min(other_first, first)
+        if other_first != combined_first:
+            deltas[('' if other_first == no_date else other_first, site)] -= sign
+            deltas[('' if combined_first == no_date else combined_first, site)] += sign
+    return deltas
+
+def build_sales_rollup_rows(frame, sign=1, shared_orders=None):
+    """
+    분석 DataFrame → 롤업 종류별 행 목록 (sign=-1이면 빼기용)
+    주문 수(order_count)는 주문의 첫 날짜에만 세는 값 (sales_rollup_order_deltas)
+    shared_orders: DB에 남아 있는 다른 행의 (날짜, 판매사이트명, 주문번호) - 주문 수 증감 계산용
+    """
+    order_deltas = sales_rollup_order_deltas(frame, sign, shared_orders)
+
+    result = {}
+    for kind, (_, keys, measures) in SALES_ROLLUPS.items():
+        if kind == 'hourly':
+            source = frame[frame['has_time']]
+        else:
+            source = frame
+        columns = [SALES_ROLLUP_SOURCE_COLUMNS.get(key, key) for key in keys]
+        if source.empty:
+            result[kind] = []
+            continue
+
+        codes = source.groupby(columns, sort=False).ngroup().to_numpy()
+        _, first_rows = np.unique(codes, return_index=True)
+        group_count = len(first_rows)
+        totals = {
+            'quantity': np.bincount(codes, weights=source['quantity'].to_numpy(dtype=float), minlength=group_count),
+            'revenue': np.bincount(codes, weights=source['revenue'].to_numpy(), minlength=group_count),
+            'profit': np.bincount(codes, weights=source['profit'].to_numpy(), minlength=group_count),
+            'row_count': np.bincount(codes, minlength=group_count),
+        }
+
+        key_values = [source[column].to_numpy()[first_rows].tolist() for column in columns]
+        rows = []
+        for i in range(group_count):
+            row = {key: values[i] for key, values in zip(keys, key_values)}
+            for measure in measures:
+                if measure == 'order_count':
+                    row[measure] = int(order_deltas.pop((row['sale_date'], row['platform']), 0))
+                    continue
+                value = totals[measure][i] * sign
+                row[measure] = float(value) if measure in ('revenue', 'profit') else int(value)
+            row['sale_date'] = row['sale_date'] or None
+            rows.append(row)
+        if 'order_count' in measures:
+            # 이 데이터에 행이 없는 날짜로 주문 수만 옮겨 가는 경우 (첫 날짜가 바뀐 주문)
+            for (sale_date, platform), delta in order_deltas.items():
+                if delta:
+                    row = {'sale_date': sale_date or None, 'platform': platform}
+                    row.update({measure: 0.0 if measure in ('revenue', 'profit') else 0 for measure in measures})
+                    row['order_count'] = int(delta)
+                    rows.append(row)
+        result[kind] = rows
+    return result
+
+
+class SalesRollupStore:
+    """
+    롤업 테이블 읽기/갱신
+    - apply(): 판매 데이터 저장/삭제분을 DB 함수(apply_sales_rollups)로 한 번에 더하거나 뺌
+    - usable(): 롤업 종류별 행 수 합계가 sales_data 행 수와 같은지 TTL마다 확인 (하나라도 다르면 스냅샷으로 대체)
+    - rebuild(): 전체 판매 데이터로 롤업 다시 생성 (최초 적용/불일치 복구용, DB 함수 한 트랜잭션)
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, ttl=ANALYTICS_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._usable = None
+        self._checked_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._usable = None
+
+    def apply(self, frame, sign=1, exclude_batch_id=None):
+        """
+        판매 데이터 DataFrame만큼 롤업 증감 (실패해도 저장/삭제는 진행, 다음 확인 때 불일치로 감지됨)
+        같은 주문번호의 다른 행이 DB에 남아 있으면 그 주문은 주문 수 증감에서 제외
+        exclude_batch_id: 방금 저장한 배치 (자기 자신은 다른 행으로 치지 않음)
+        """
+        try:
+            shared_orders = self._fetch_order_pairs(frame['order'].dropna().unique().tolist(), exclude_batch_id)
+            deltas = build_sales_rollup_rows(frame, sign, shared_orders)
+            if any(deltas.values()):
+                supabase.rpc('apply_sales_rollups', {'p_deltas': deltas}).execute()
+        except Exception as e:
+            print(f"⚠️ 판매 롤업 갱신 실패 (재생성 필요: POST /api/analytics/rollups/rebuild): {e}")
+        self.invalidate()
+
+    def usable(self):
+        with self._lock:
+            if self._usable is not None and time.time() - self._checked_at < self.ttl:
+                return self._usable
+        try:
+            expected = supabase.table('sales_data').select('id', count='exact').limit(1).execute().count or 0
+            totals = self._fetch_totals()
+            # 시간대 롤업은 주문일 있는 행만 (= 날짜가 있는 플랫폼 롤업 행 수)
+            expected_by_kind = {'platform': expected, 'product': expected, 'region': expected,
+                                'hourly': totals.get('platform_dated') or 0}
+            mismatched = [kind for kind, count in expected_by_kind.items() if (totals.get(kind) or 0) != count]
+            usable = not mismatched
+            if not usable:
+                detail = ', '.join(f"{kind} {totals.get(kind) or 0}건" for kind in mismatched)
+                print(f"⚠️ 판매 롤업 불일치 ({detail} / 판매 데이터 {expected}건) - 스냅샷 집계 사용")
+        except Exception as e:
+            print(f"⚠️ 판매 롤업 조회 불가 - 스냅샷 집계 사용: {e}")
+            usable = False
+        with self._lock:
+            self._usable = usable
+            self._checked_at = time.time()
+        return usable
+
+    def frame(self, kind, start_date=None, end_date=None):
+        """롤업 행 DataFrame (start_date 이상, end_date 미만 날짜)"""
+        _, keys, measures = SALES_ROLLUPS[kind]
+        rows = self._fetch_rows(kind, start_date=start_date, end_date=end_date)
+        frame = pd.DataFrame(rows, columns=keys + measures, dtype=object)
+        for measure in measures:
+            frame[measure] = pd.to_numeric(frame[measure]).to_numpy(dtype=float)
+        return frame
+
+    def rebuild(self):
+        """전체 판매 데이터 스냅샷으로 롤업 재생성 → 종류별 행 수"""
+        SALES_ANALYTICS.invalidate()
+        rows_by_kind = build_sales_rollup_rows(SALES_ANALYTICS.frame())
+        # 비우기와 다시 채우기를 DB 함수 한 트랜잭션으로 (중간에 실패하면 기존 롤업 그대로)
+        supabase.rpc('replace_sales_rollups', {'p_rows': rows_by_kind}).execute()
+        self.invalidate()
+        return {kind: len(rows) for kind, rows in rows_by_kind.items()}
+
+    def _fetch_totals(self):
+        """
+        롤업 종류별 행 수 합계 + 날짜 있는 플랫폼 롤업 행 수(platform_dated)
+        DB 함수(sales_rollup_totals)로 한 번에 받고, 함수가 없으면 롤업 행을 받아서 합산
+        """
+        try:
+            totals = supabase.rpc('sales_rollup_totals', {}).execute().data
+            if isinstance(totals, dict):
+                return totals
+        except Exception as e:
+            print(f"⚠️ sales_rollup_totals 함수 호출 실패, 롤업 행으로 합산: {e}")
+
+        totals = {}
+        for kind in SALES_ROLLUPS:
+            rows = self._fetch_rows(kind, columns='sale_date, row_count')
+            totals[kind] = sum(row.get('row_count') or 0 for row in rows)
+            if kind == 'platform':
+                totals['platform_dated'] = sum(row.get('row_count') or 0 for row in rows if row.get('sale_date'))
+        return totals
+
+    def _fetch_order_pairs(self, order_numbers, exclude_batch_id=None):
+        """주문번호가 같은 sales_data 행의 (날짜, 판매사이트명, 주문번호)"""
+        pairs = set()
+        # 500개씩 나눠서 조회 (Supabase 제한)
+        for i in range(0, len(order_numbers), 500):
+            query = supabase.table('sales_data').select(', '.join(SALES_ANALYTICS_COLUMNS)).in_('주문번호', order_numbers[i:i+500])
+            if exclude_batch_id is not None:
+                query = query.neq('upload_batch_id', exclude_batch_id)
+            rows = query.execute().data or []
+            if rows:
+                existing = build_sales_frame(rows)
+                pairs.update(zip(existing['sale_date'].tolist(), existing['site'].tolist(), existing['order'].tolist()))
+        return pairs
+
+    def _fetch_rows(self, kind, columns=None, start_date=None, end_date=None):
+        table, keys, measures = SALES_ROLLUPS[kind]
+        rows = []
+        start = 0
+        while True:
+            query = supabase.table(table).select(columns or ', '.join(keys + measures))
+            if start_date is not None:
+                query = query.gte('sale_date', start_date.isoformat())
+            if end_date is not None:
+                query = query.lt('sale_date', end_date.isoformat())
+            batch = query.order('id').range(start, start + self.PAGE_SIZE - 1).execute().data or []
+            rows.extend(batch)
+            if len(batch) < self.PAGE_SIZE:
+                return rows
+            start += self.PAGE_SIZE
+
+SALES_ROLLUP_STORE = SalesRollupStore()
+
+def get_request_analytics_rollup(kind, default_period='all'):
+    """요청 기간의 롤업 DataFrame - 롤업을 쓸 수 없으면 None (호출자가 스냅샷으로 집계)"""
+    if not SALES_ROLLUP_STORE.usable():
+        return None
+    start_date, end_date = get_analytics_date_range(
+        request.args.get('period', default_period),
+        request.args.get('start_date'),
+        request.args.get('end_date')
+    )
+    try:
+        return SALES_ROLLUP_STORE.frame(kind, start_date, end_date)
+    except Exception as e:
+        print(f"⚠️ 판매 롤업 조회 실패 - 스냅샷 집계 사용: {e}")
+        return None
+
+@app.route('/api/analytics/rollups/rebuild', methods=['POST'])
+@admin_required
+def rebuild_analytics_rollups():
+    """판매 롤업 테이블 재생성"""
+    if not DB_CONNECTED:
+        return jsonify({'error': 'DB 연결 필요'}), 400
+
+    try:
+        counts = SALES_ROLLUP_STORE.rebuild()
+        print(f"✅ 판매 롤업 재생성 완료: {counts}")
+        return jsonify({'success': True, 'data': counts})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def get_analytics_date_range(period, custom_start=None, custom_end=None):
+    """
+    분석 기간 (시작일, 종료일 다음날) - 없는 쪽은 None
+    custom_start/custom_end(YYYY-MM-DD)가 있으면 우선, 없으면 period 프리셋 (all이면 전체)
+    """
+    today = get_kst_today()
+    start_date = None
+    end_date = None
+
+    # 커스텀 날짜 범위가 있으면 사용
+    if custom_start:
+        start_date = datetime.strptime(custom_start, '%Y-%m-%d').date()
+    elif period == 'day':
+        start_date = today
+    elif period == 'week':
+        start_date = today - timedelta(days=7)
+    elif period == 'month':
+        start_date = today - timedelta(days=30)
+    elif period == 'quarter':
+        start_date = today - timedelta(days=90)
+    elif period == 'half':
+        start_date = today - timedelta(days=180)
+    elif period == 'year':
+        start_date = today - timedelta(days=365)
+    # period == 'all' 이면 start_date = None
+
+    if custom_end:
+        # end_date의 다음날 00:00 이전까지
+        end_date = datetime.strptime(custom_end, '%Y-%m-%d').date() + timedelta(days=1)
+
+    return start_date, end_date
+
+
+def fetch_sales_summary(start_date, end_date):
+    """
+    기간 내 매출 합계/순이익 합계/고유 주문번호 수/행 수
+    DB 함수(analytics_summary)로 집계해서 한 행만 받고, 함수가 없으면 행을 받아서 파이썬으로 집계
+    """
+    try:
+        response = supabase.rpc('analytics_summary', {
+            'p_start': start_date.isoformat() if start_date else None,
+            'p_end': end_date.isoformat() if end_date else None
+        }).execute()
+        row = (response.data or [{}])[0]
+        return (float(row.get('total_revenue') or 0), float(row.get('total_profit') or 0),
+                int(row.get('unique_orders') or 0), int(row.get('row_count') or 0))
+    except Exception as e:
+        print(f"⚠️ analytics_summary 함수 호출 실패, 행 단위 집계로 대체: {e}")
+
+    def where(query):
         if start_date:
             query = query.gte('주문일', start_date.isoformat())
         if end_date:
-            # end_date의 다음날 00:00 이전까지
-            end_date_next = end_date + timedelta(days=1)
-            query = query.lt('주문일', end_date_next.isoformat())
-
-        response = query.execute()
-        data = response.data or []
-
+            query = query.lt('주문일', end_date.isoformat())
+        return query
+
+    total_revenue = 0
+    total_profit = 0
+    order_numbers = set()
+    row_count = 0
+    for data in iter_sales_data('판매가, 순이익, 주문번호, 배송비금액', where):
         # 매출: 각 row의 (판매가 + 배송비) 합산
-        total_revenue = sum(
+        total_revenue += sum(
             float(d.get('판매가', 0) or 0) + float(d.get('배송비금액', 0) or 0)
             for d in data
         )
-        total_profit = sum(float(d.get('순이익', 0) or 0) for d in data)
+        total_profit += sum(float(d.get('순이익', 0) or 0) for d in data)
+        order_numbers.update(d.get('주문번호') for d in data if d.get('주문번호'))
+        row_count += len(data)
+    return total_revenue, total_profit, len(order_numbers), row_count
+
+
+@app.route('/api/analytics/summary', methods=['GET'])
+@admin_required
+def get_analytics_summary():
+    """KPI 요약 데이터 (프리셋 또는 커스텀 날짜 범위)"""
+    if not DB_CONNECTED:
+        return jsonify({'error': 'DB 연결 필요'}), 400
+
+    period = request.args.get('period', 'month')
+    custom_start = request.args.get('start_date')  # YYYY-MM-DD
+    custom_end = request.args.get('end_date')      # YYYY-MM-DD
+
+    try:
+        start_date, end_date = get_analytics_date_range(period, custom_start, custom_end)
+        total_revenue, total_profit, unique_orders, row_count = fetch_sales_summary(start_date, end_date)
+
         # 주문 수: 주문번호 기준 고유 개수 (같은 주문의 여러 상품 중복 제거)
-        unique_order_numbers = set(d.get('주문번호') for d in data if d.get('주문번호'))
-        total_orders = len(unique_order_numbers) if unique_order_numbers else len(data)
+        total_orders = unique_orders if unique_orders else row_count
         aov = total_revenue / total_orders if total_orders > 0 else 0
         margin_rate = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
 
@@ -3139,33 +5086,24 @@ def get_analytics_platform():
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        response = supabase.table('sales_data').select('판매사이트명, 판매가, 주문수량, 순이익, 주문번호, 배송비금액').execute()
-        data = response.data or []
-
-        platform_stats = {}
-        platform_orders = {}  # 플랫폼별 고유 주문번호 추적
-        for d in data:
-            site = d.get('판매사이트명') or '기타'
-            if site not in platform_stats:
-                platform_stats[site] = {'revenue': 0, 'profit': 0, 'orders': 0}
-                platform_orders[site] = set()
-
-            # 매출: 각 row의 (판매가 + 배송비) 합산
-            revenue = float(d.get('판매가', 0) or 0) + float(d.get('배송비금액', 0) or 0)
-            profit = float(d.get('순이익', 0) or 0)
-
-            platform_stats[site]['revenue'] += revenue
-            platform_stats[site]['profit'] += profit
-
+        # 롤업 주문 수는 주문의 첫 날짜에만 세어져 있어서 기간 합계에 중복이 없음
+        # (기간 시작 전에 첫 주문이 있는 주문번호는 스냅샷과 달리 기간 주문 수에 안 들어감)
+        rollup = get_request_analytics_rollup('platform')
+        if rollup is not None:
+            platforms, codes, _, revenue = grouped_totals(rollup, 'platform')
+            orders = np.bincount(codes, weights=rollup['order_count'].to_numpy(), minlength=len(platforms))
+            profit = np.bincount(codes, weights=rollup['profit'].to_numpy(), minlength=len(platforms))
+        else:
+            frame = get_request_analytics_frame()
+            platforms, codes, _, revenue = grouped_totals(frame, 'site')
             # 주문 수: 주문번호 기준 고유 개수
-            order_number = d.get('주문번호')
-            if order_number and order_number not in platform_orders[site]:
-                platform_orders[site].add(order_number)
-                platform_stats[site]['orders'] += 1
-            elif not order_number:
-                platform_stats[site]['orders'] += 1
-
-        result = [{'platform': k, **v} for k, v in platform_stats.items()]
+            orders = grouped_order_counts(frame, codes, len(platforms))
+            profit = np.bincount(codes, weights=frame['profit'].to_numpy(), minlength=len(platforms))
+
+        result = [
+            {'platform': platform, 'revenue': float(revenue[i]), 'profit': float(profit[i]), 'orders': int(orders[i])}
+            for i, platform in enumerate(platforms)
+        ]
         result.sort(key=lambda x: x['revenue'], reverse=True)
 
         return jsonify({'success': True, 'data': result})
@@ -3181,27 +5119,17 @@ def get_analytics_time_heatmap():
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        response = supabase.table('sales_data').select('주문일').execute()
-        data = response.data or []
+        rollup = get_request_analytics_rollup('hourly')
+        if rollup is not None:
+            counts = rollup.groupby(['weekday', 'hour'], sort=False)['row_count'].sum()
+        else:
+            frame = get_request_analytics_frame()
+            frame = frame[frame['has_time']]
+            counts = frame.groupby(['weekday', 'hour'], sort=False).size()
 
         heatmap = {}
-        days = ['월', '화', '수', '목', '금', '토', '일']
-
-        for d in data:
-            order_date = d.get('주문일')
-            if order_date:
-                try:
-                    dt = datetime.fromisoformat(order_date.replace('Z', '+00:00'))
-                    day = days[dt.weekday()]
-                    hour = dt.hour
-
-                    if day not in heatmap:
-                        heatmap[day] = {}
-                    if hour not in heatmap[day]:
-                        heatmap[day][hour] = 0
-                    heatmap[day][hour] += 1
-                except:
-                    pass
+        for (weekday, hour), count in counts.items():
+            heatmap.setdefault(WEEKDAY_NAMES[int(weekday)], {})[int(hour)] = int(count)
 
         return jsonify({'success': True, 'data': heatmap})
     except Exception as e:
@@ -3216,28 +5144,15 @@ def get_analytics_repurchase():
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        response = supabase.table('sales_data').select('구매자휴대폰번호, 주문번호').execute()
-        data = response.data or []
-
-        # 휴대폰번호별 고유 주문 횟수 집계 (주문번호 기준 중복 제거)
-        phone_orders = {}  # {phone: set(order_numbers)}
-        for d in data:
-            phone = d.get('구매자휴대폰번호')
-            order_number = d.get('주문번호')
-            if phone:
-                if phone not in phone_orders:
-                    phone_orders[phone] = set()
-                if order_number:
-                    phone_orders[phone].add(order_number)
-                else:
-                    # 주문번호가 없으면 row 단위로 카운트
-                    phone_orders[phone].add(f"__no_order_{len(phone_orders[phone])}")
+        frame = get_request_analytics_frame()
+        frame = frame[frame['phone'].notna()]
 
-        # 고유 주문 수 기준으로 계산
-        phone_counts = {phone: len(orders) for phone, orders in phone_orders.items()}
+        # 휴대폰번호별 고유 주문 횟수 (주문번호가 없으면 row 단위로 카운트)
+        codes, phones = pd.factorize(frame['phone'])
+        phone_counts = grouped_order_counts(frame, codes, len(phones))
 
-        new_customers = sum(1 for count in phone_counts.values() if count == 1)
-        repeat_customers = sum(1 for count in phone_counts.values() if count > 1)
+        new_customers = int((phone_counts == 1).sum())
+        repeat_customers = int((phone_counts > 1).sum())
 
         total = new_customers + repeat_customers
         return jsonify({
@@ -3260,33 +5175,10 @@ def get_analytics_gift():
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        response = supabase.table('sales_data').select('is_gift, 주문번호').execute()
-        data = response.data or []
-
-        # 주문번호 기준 중복 제거하여 집계
-        self_orders = set()
-        gift_orders = set()
-        self_count_no_order = 0
-        gift_count_no_order = 0
-
-        for d in data:
-            order_number = d.get('주문번호')
-            is_gift = d.get('is_gift')
-
-            if order_number:
-                if is_gift:
-                    gift_orders.add(order_number)
-                else:
-                    self_orders.add(order_number)
-            else:
-                # 주문번호가 없으면 row 단위로 카운트
-                if is_gift:
-                    gift_count_no_order += 1
-                else:
-                    self_count_no_order += 1
-
-        self_purchase = len(self_orders) + self_count_no_order
-        gift_purchase = len(gift_orders) + gift_count_no_order
+        frame = get_request_analytics_frame()
+        # 주문번호 기준 중복 제거하여 집계 (0: 본인 구매, 1: 선물)
+        codes = frame['is_gift'].to_numpy().astype(np.int64)
+        self_purchase, gift_purchase = (int(count) for count in grouped_order_counts(frame, codes, 2))
 
         total = self_purchase + gift_purchase
         return jsonify({
@@ -3313,66 +5205,31 @@ def get_analytics_top_products():
     per_page = int(request.args.get('per_page', 10))
 
     try:
-        response = supabase.table('sales_data').select('상품명, 주문선택사항, 주문수량, 판매가, 판매사이트명, 배송비금액').execute()
-        data = response.data or []
+        frame = get_request_analytics_rollup('product')
+        if frame is not None:
+            frame = add_product_keys(frame)
+        else:
+            frame = get_request_analytics_frame()
 
         if mode == 'detail':
             # 상세: 플랫폼별로 구분
-            product_stats = {}
-            for d in data:
-                product = d.get('상품명') or '알 수 없음'
-                option = d.get('주문선택사항') or ''
-                platform = d.get('판매사이트명') or '기타'
-
-                # 플랫폼 간소화
-                if '쿠팡' in platform:
-                    platform = '쿠팡'
-                elif '스마트스토어' in platform or '네이버' in platform:
-                    platform = '스마트스토어'
-                elif '11번가' in platform:
-                    platform = '11번가'
-                elif 'ESM' in platform or 'G마켓' in platform or '옥션' in platform:
-                    platform = 'ESM'
-                else:
-                    platform = '기타'
-
-                key = f"{product}|{option}|{platform}"
-                qty = int(d.get('주문수량', 1) or 1)
-                # 매출: 판매가 + 배송비
-                price = float(d.get('판매가', 0) or 0)
-                shipping = float(d.get('배송비금액', 0) or 0)
-                revenue = price + shipping
-
-                if key not in product_stats:
-                    product_stats[key] = {
-                        'product': f"{product} | {option}" if option else product,
-                        'platform': platform,
-                        'quantity': 0,
-                        'revenue': 0
-                    }
-                product_stats[key]['quantity'] += qty
-                product_stats[key]['revenue'] += revenue
-
-            sorted_products = sorted(product_stats.values(), key=lambda x: x['quantity'], reverse=True)
+            keys, codes, quantity, revenue = grouped_totals(frame, 'detail_key')
+            _, first_rows = np.unique(codes, return_index=True)
+            labels = frame['product_label'].to_numpy()[first_rows]
+            platforms = frame['platform_group'].to_numpy()[first_rows]
+            product_stats = [
+                {'product': labels[i], 'platform': platforms[i], 'quantity': int(quantity[i]), 'revenue': revenue[i]}
+                for i in range(len(keys))
+            ]
         else:
             # 전체: 플랫폼 구분 없이
-            product_stats = {}
-            for d in data:
-                product = d.get('상품명') or '알 수 없음'
-                option = d.get('주문선택사항') or ''
-                key = f"{product} | {option}" if option else product
-                qty = int(d.get('주문수량', 1) or 1)
-                # 매출: 판매가 + 배송비
-                price = float(d.get('판매가', 0) or 0)
-                shipping = float(d.get('배송비금액', 0) or 0)
-                revenue = price + shipping
-
-                if key not in product_stats:
-                    product_stats[key] = {'product': key, 'quantity': 0, 'revenue': 0}
-                product_stats[key]['quantity'] += qty
-                product_stats[key]['revenue'] += revenue
-
-            sorted_products = sorted(product_stats.values(), key=lambda x: x['quantity'], reverse=True)
+            keys, _, quantity, revenue = grouped_totals(frame, 'product_label')
+            product_stats = [
+                {'product': key, 'quantity': int(quantity[i]), 'revenue': revenue[i]}
+                for i, key in enumerate(keys)
+            ]
+
+        sorted_products = sorted(product_stats, key=lambda x: x['quantity'], reverse=True)
 
         # 페이지네이션
         total = len(sorted_products)
@@ -3385,7 +5242,7 @@ def get_analytics_top_products():
         result = []
         for i, item in enumerate(paginated):
             item['rank'] = start + i + 1
-            item['revenue'] = round(item['revenue'], 0)
+            item['revenue'] = round(float(item['revenue']), 0)
             result.append(item)
 
         return jsonify({
@@ -3410,33 +5267,16 @@ def get_analytics_regions():
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        response = supabase.table('sales_data').select('배송지주소, 주문수량, 판매가, 배송비금액').execute()
-        data = response.data or []
-
-        region_stats = {}
-        for d in data:
-            address = d.get('배송지주소') or ''
-            parts = address.split()
-            if len(parts) >= 2:
-                region = f"{parts[0]} {parts[1]}"
-            elif len(parts) == 1:
-                region = parts[0]
-            else:
-                region = '기타'
+        frame = get_request_analytics_rollup('region')
+        if frame is None:
+            frame = get_request_analytics_frame()
+        regions, _, quantity, revenue = grouped_totals(frame, 'region')
 
-            qty = int(d.get('주문수량', 1) or 1)
-            # 매출: 판매가 + 배송비
-            price = float(d.get('판매가', 0) or 0)
-            shipping = float(d.get('배송비금액', 0) or 0)
-            revenue = price + shipping
-
-            if region not in region_stats:
-                region_stats[region] = {'quantity': 0, 'revenue': 0}
-            region_stats[region]['quantity'] += qty
-            region_stats[region]['revenue'] += revenue
-
-        sorted_regions = sorted(region_stats.items(), key=lambda x: x[1]['quantity'], reverse=True)[:10]
-        result = [{'rank': i+1, 'region': k, 'quantity': v['quantity'], 'revenue': round(v['revenue'], 0)} for i, (k, v) in enumerate(sorted_regions)]
+        ranked = sorted(range(len(regions)), key=lambda i: quantity[i], reverse=True)[:10]
+        result = [
+            {'rank': rank + 1, 'region': regions[i], 'quantity': int(quantity[i]), 'revenue': round(float(revenue[i]), 0)}
+            for rank, i in enumerate(ranked)
+        ]
 
         return jsonify({'success': True, 'data': result})
     except Exception as e:
@@ -3451,83 +5291,122 @@ def get_analytics_hourly():
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        response = supabase.table('sales_data').select('주문일, 주문수량, 판매가, 배송비금액').execute()
-        data = response.data or []
-
-        hourly_stats = {}
-        for d in data:
-            order_date = d.get('주문일')
-            if order_date:
-                try:
-                    dt = datetime.fromisoformat(order_date.replace('Z', '+00:00'))
-                    hour = dt.hour
-                    hour_key = f"{hour:02d}:00~{hour:02d}:59"
-
-                    qty = int(d.get('주문수량', 1) or 1)
-                    # 매출: 판매가 + 배송비
-                    price = float(d.get('판매가', 0) or 0)
-                    shipping = float(d.get('배송비금액', 0) or 0)
-                    revenue = price + shipping
-
-                    if hour_key not in hourly_stats:
-                        hourly_stats[hour_key] = {'hour': hour, 'quantity': 0, 'revenue': 0}
-                    hourly_stats[hour_key]['quantity'] += qty
-                    hourly_stats[hour_key]['revenue'] += revenue
-                except:
-                    pass
-
-        sorted_hourly = sorted(hourly_stats.items(), key=lambda x: x[1]['quantity'], reverse=True)[:10]
-        result = [{'rank': i+1, 'hour': k, 'quantity': v['quantity'], 'revenue': round(v['revenue'], 0)} for i, (k, v) in enumerate(sorted_hourly)]
+        frame = get_request_analytics_rollup('hourly')
+        if frame is None:
+            frame = get_request_analytics_frame()
+            frame = frame[frame['has_time']]
+        hours, _, quantity, revenue = grouped_totals(frame, 'hour')
+        hours = [int(hour) for hour in hours]
+
+        ranked = sorted(range(len(hours)), key=lambda i: quantity[i], reverse=True)[:10]
+        result = [
+            {'rank': rank + 1, 'hour': f"{hours[i]:02d}:00~{hours[i]:02d}:59",
+             'quantity': int(quantity[i]), 'revenue': round(float(revenue[i]), 0)}
+            for rank, i in enumerate(ranked)
+        ]
 
         return jsonify({'success': True, 'data': result})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# 고객 목록 정렬 가능 컬럼 (schema_attendance.sql의 (컬럼, id) 인덱스와 짝)
+CUSTOMER_SORT_COLUMNS = ['총주문횟수', '총구매금액', '선물발송횟수', '최근구매일', '첫구매일', '구매자명', '휴대폰번호']
+CUSTOMERS_MAX_PER_PAGE = 500
+
+def _postgrest_value(value):
+    """PostgREST 필터 값 - 쉼표/괄호가 있어도 되도록 큰따옴표로 감쌈"""
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+def encode_customer_cursor(row, sort_by):
+    """다음 페이지 커서 - 마지막 행의 (정렬 값, id)"""
+    raw = json.dumps([row.get(sort_by), row.get('id')], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_customer_cursor(cursor):
+    value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    return value, int(last_id)
+
+def customer_cursor_filter(sort_by, is_desc, value, last_id):
+    """
+    (정렬 컬럼, id) 키셋 조건 - 정렬은 PostgreSQL 기본 NULL 위치 (오름차순 NULLS LAST, 내림차순 NULLS FIRST)
+    """
+    if is_desc:
+        if value is None:
+            return f"and({sort_by}.is.null,id.lt.{last_id}),{sort_by}.not.is.null"
+        v = _postgrest_value(value)
+        return f"{sort_by}.lt.{v},and({sort_by}.eq.{v},id.lt.{last_id})"
+    if value is None:
+        return f"and({sort_by}.is.null,id.gt.{last_id})"
+    v = _postgrest_value(value)
+    return f"{sort_by}.gt.{v},and({sort_by}.eq.{v},id.gt.{last_id}),{sort_by}.is.null"
+
 @app.route('/api/analytics/customers', methods=['GET'])
 @admin_required
 def get_analytics_customers():
-    """고객 목록 조회 (검색, 정렬, 페이지네이션)"""
+    """
+    고객 목록 조회 (검색, 정렬, 페이지네이션)
+    - page: 해당 페이지만 DB에서 range로 조회 + 전체 개수(count)
+    - cursor: 이전 응답의 next_cursor로 다음 페이지를 키셋 조회 (깊은 페이지도 일정한 속도, 전체 개수 생략)
+    """
     if not DB_CONNECTED:
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     search = request.args.get('search', '').strip()
     sort_by = request.args.get('sort_by', '총주문횟수')
     sort_order = request.args.get('sort_order', 'desc')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
+    cursor = request.args.get('cursor')
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 50)), 1), CUSTOMERS_MAX_PER_PAGE)
+    except ValueError:
+        return jsonify({'error': 'page와 per_page는 정수여야 합니다'}), 400
+
+    if sort_by not in CUSTOMER_SORT_COLUMNS:
+        return jsonify({'error': f'정렬할 수 없는 컬럼입니다: {sort_by}'}), 400
 
     try:
-        # 기본 쿼리
-        query = supabase.table('customers').select('*')
-        
+        is_desc = sort_order == 'desc'
+        filters = []
+
         # 검색 (휴대폰번호, 구매자명, 주요배송지)
         if search:
-            # Supabase에서 or 필터링 (주소 검색 추가)
-            query = query.or_(f"휴대폰번호.ilike.%{search}%,구매자명.ilike.%{search}%,주요배송지.ilike.%{search}%")
-        
-        # 정렬
-        is_desc = sort_order == 'desc'
-        query = query.order(sort_by, desc=is_desc)
-        
-        response = query.execute()
-        all_data = response.data or []
-        
-        # 페이지네이션
-        total = len(all_data)
-        total_pages = (total + per_page - 1) // per_page
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated = all_data[start:end]
-        
+            filters.append(f"휴대폰번호.ilike.%{search}%,구매자명.ilike.%{search}%,주요배송지.ilike.%{search}%")
+
+        if cursor:
+            try:
+                value, last_id = decode_customer_cursor(cursor)
+            except Exception:
+                return jsonify({'error': '잘못된 커서입니다'}), 400
+            filters.append(customer_cursor_filter(sort_by, is_desc, value, last_id))
+
+        # 기본 쿼리 (커서 조회는 전체 개수 생략)
+        query = supabase.table('customers').select('*', count=None if cursor else 'exact')
+        if len(filters) == 1:
+            query = query.or_(filters[0])
+        elif filters:
+            query = query.or_(f"and(or({filters[0]}),or({filters[1]}))")
+
+        # 정렬 (같은 값은 id로 고정해야 페이지 경계가 안 흔들림)
+        query = query.order(sort_by, desc=is_desc).order('id', desc=is_desc)
+
+        start = 0 if cursor else (page - 1) * per_page
+        response = query.range(start, start + per_page - 1).execute()
+        paginated = response.data or []
+
+        total = None if cursor else (response.count or 0)
+        next_cursor = encode_customer_cursor(paginated[-1], sort_by) if len(paginated) == per_page else None
+
         return jsonify({
             'success': True,
             'data': paginated,
             'pagination': {
-                'page': page,
+                'page': None if cursor else page,
                 'per_page': per_page,
                 'total': total,
-                'total_pages': total_pages
+                'total_pages': None if cursor else (total + per_page - 1) // per_page,
+                'next_cursor': next_cursor
             }
         })
     except Exception as e:
@@ -3578,8 +5457,11 @@ def delete_analytics_batch(batch_id):
         return jsonify({'error': 'DB 연결 필요'}), 400
 
     try:
-        # 1. 판매 데이터 삭제
+        # 1. 판매 데이터 삭제 (롤업에서 뺄 값은 삭제 전에 조회)
+        batch_frame = load_sales_frame(where=lambda q: q.eq('upload_batch_id', batch_id))
         supabase.table('sales_data').delete().eq('upload_batch_id', batch_id).execute()
+        SALES_ANALYTICS.invalidate()
+        SALES_ROLLUP_STORE.apply(batch_frame, sign=-1)
 
         # 2. 남은 판매 데이터 확인
         remaining = supabase.table('sales_data').select('id').limit(1).execute()
@@ -3588,30 +5470,22 @@ def delete_analytics_batch(batch_id):
         if not remaining.data:
             supabase.table('customers').delete().neq('id', 0).execute()
         else:
-            # 4. 판매 데이터가 남아있으면 고객 통계 재계산
-            recalculate_customer_stats()
+            # 4. 판매 데이터가 남아있으면 삭제된 배치의 고객만 재계산
+            recalculate_customer_stats(batch_frame['phone'].dropna().unique().tolist())
 
         return jsonify({'success': True, 'message': '선택한 업로드 데이터가 삭제되었습니다.'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-def recalculate_customer_stats():
-    """남은 sales_data 기반으로 고객 통계 재계산"""
-    if not DB_CONNECTED or not supabase:
-        return
+CUSTOMER_STATS_COLUMNS = '구매자휴대폰번호, 주문번호, 구매자명, 구매자ID, 배송지주소, 주문일, 판매가, 배송비금액, is_gift'
 
-    try:
-        # 1. 모든 판매 데이터 조회
-        sales_response = supabase.table('sales_data').select('*').execute()
-        sales_data = sales_response.data or []
-
-        if not sales_data:
-            return
-
-        # 2. 고객별 통계 집계 (주문번호 기준 중복 제거)
-        customer_stats = {}
-        for sale in sales_data:
+def aggregate_customer_stats(sales_pages):
+    """판매 데이터 페이지들(id 순서) → {휴대폰번호: 고객 행} (주문번호 기준 중복 제거)"""
+    customer_stats = {}
+    processed_orders = defaultdict(set)
+    for page in sales_pages:
+        for sale in page:
             phone = sale.get('구매자휴대폰번호')
             if not phone:
                 continue
@@ -3620,6 +5494,7 @@ def recalculate_customer_stats():
 
             if phone not in customer_stats:
                 customer_stats[phone] = {
+                    '휴대폰번호': phone,
                     '구매자명': sale.get('구매자명'),
                     '구매자ID': sale.get('구매자ID'),
                     '총주문횟수': 0,
@@ -3627,64 +5502,103 @@ def recalculate_customer_stats():
                     '선물발송횟수': 0,
                     '최근구매일': None,
                     '주요배송지': sale.get('배송지주소'),
-                    '첫구매일': sale.get('주문일'),
-                    '처리된_주문번호': set()
+                    '첫구매일': sale.get('주문일')
                 }
+            stats = customer_stats[phone]
 
             # 주문번호 기준 중복 제거
             if order_number:
-                if order_number not in customer_stats[phone]['처리된_주문번호']:
-                    customer_stats[phone]['총주문횟수'] += 1
-                    customer_stats[phone]['처리된_주문번호'].add(order_number)
+                if order_number not in processed_orders[phone]:
+                    stats['총주문횟수'] += 1
+                    processed_orders[phone].add(order_number)
             else:
-                customer_stats[phone]['총주문횟수'] += 1
+                stats['총주문횟수'] += 1
 
             # 금액 합산 (판매가 + 배송비)
             price = float(sale.get('판매가') or 0)
             shipping = float(sale.get('배송비금액') or 0)
-            customer_stats[phone]['총구매금액'] += price + shipping
+            stats['총구매금액'] += price + shipping
 
             # 선물 횟수
             if sale.get('is_gift'):
-                customer_stats[phone]['선물발송횟수'] += 1
+                stats['선물발송횟수'] += 1
 
             # 최근/첫 구매일 업데이트
             order_date = sale.get('주문일')
             if order_date:
-                if not customer_stats[phone]['최근구매일'] or order_date > customer_stats[phone]['최근구매일']:
-                    customer_stats[phone]['최근구매일'] = order_date
-                    customer_stats[phone]['주요배송지'] = sale.get('배송지주소')
-                if not customer_stats[phone]['첫구매일'] or order_date < customer_stats[phone]['첫구매일']:
-                    customer_stats[phone]['첫구매일'] = order_date
-
-        # 3. 기존 고객 중 sales_data에 없는 고객 삭제
-        existing_response = supabase.table('customers').select('휴대폰번호').execute()
-        existing_phones = {c['휴대폰번호'] for c in (existing_response.data or [])}
-        phones_to_delete = existing_phones - set(customer_stats.keys())
-
-        for phone in phones_to_delete:
-            supabase.table('customers').delete().eq('휴대폰번호', phone).execute()
-
-        # 4. 고객 통계 업데이트
-        for phone, stats in customer_stats.items():
-            update_data = {
-                '휴대폰번호': phone,
-                '구매자명': stats['구매자명'],
-                '구매자ID': stats['구매자ID'],
-                '총주문횟수': stats['총주문횟수'],
-                '총구매금액': stats['총구매금액'],
-                '선물발송횟수': stats['선물발송횟수'],
-                '최근구매일': stats['최근구매일'],
-                '첫구매일': stats['첫구매일'],
-                '주요배송지': stats['주요배송지']
-            }
-            supabase.table('customers').upsert(update_data, on_conflict='휴대폰번호').execute()
+                if not stats['최근구매일'] or order_date > stats['최근구매일']:
+                    stats['최근구매일'] = order_date
+                    stats['주요배송지'] = sale.get('배송지주소')
+                if not stats['첫구매일'] or order_date < stats['첫구매일']:
+                    stats['첫구매일'] = order_date
+    return customer_stats
+
+def fetch_customer_stats(phones):
+    """
+    휴대폰번호별 고객 통계를 DB 함수(customer_stats)로 한 번에 집계
+    함수가 없으면 해당 번호의 판매 데이터만 받아서 파이썬으로 집계
+    """
+    try:
+        response = supabase.rpc('customer_stats', {'p_phones': phones}).execute()
+        return {row['휴대폰번호']: row for row in (response.data or [])}
+    except Exception as e:
+        print(f"⚠️ customer_stats 함수 호출 실패, 판매 데이터로 집계: {e}")
+
+    customer_stats = {}
+    # 500개씩 나눠서 조회 (Supabase 제한)
+    for i in range(0, len(phones), 500):
+        chunk = phones[i:i+500]
+        pages = iter_sales_data(CUSTOMER_STATS_COLUMNS, lambda q: q.in_('구매자휴대폰번호', chunk))
+        customer_stats.update(aggregate_customer_stats(pages))
+    return customer_stats
+
+def recalculate_customer_stats(phones=None):
+    """
+    남은 sales_data 기반으로 고객 통계 재계산
+    phones가 주어지면 그 고객들만 (배치 삭제 시 삭제된 배치의 고객), 없으면 전체
+    """
+    if not DB_CONNECTED or not supabase:
+        return
 
-        print(f"✅ 고객 통계 재계산 완료: {len(customer_stats)}명")
+    try:
+        # 1. 고객별 통계 집계
+        if phones is not None:
+            phones = list(phones)
+            if not phones:
+                return
+            customer_stats = fetch_customer_stats(phones)
+            stale_phones = [phone for phone in phones if phone not in customer_stats]
+        else:
+            customer_stats = aggregate_customer_stats(iter_sales_data(CUSTOMER_STATS_COLUMNS))
+            if not customer_stats:
+                return
+            existing_phones = []
+            start = 0
+            while True:
+                page = (supabase.table('customers').select('휴대폰번호').order('id')
+                        .range(start, start + 999).execute().data or [])
+                existing_phones.extend(c['휴대폰번호'] for c in page)
+                if len(page) < 1000:
+                    break
+                start += 1000
+            stale_phones = [phone for phone in existing_phones if phone not in customer_stats]
+
+        # 2. 판매 데이터가 남지 않은 고객 삭제 (in_ 한 번, 500개 단위)
+        for i in range(0, len(stale_phones), 500):
+            supabase.table('customers').delete().in_('휴대폰번호', stale_phones[i:i+500]).execute()
+
+        # 3. 고객 통계 일괄 upsert
+        upsert_customers = list(customer_stats.values())
+        for i in range(0, len(upsert_customers), 500):
+            supabase.table('customers').upsert(upsert_customers[i:i+500], on_conflict='휴대폰번호').execute()
+
+        print(f"✅ 고객 통계 재계산 완료: {len(customer_stats)}명 갱신, {len(stale_phones)}명 삭제")
 
     except Exception as e:
         print(f"❌ 고객 통계 재계산 오류: {e}")
     
+resume_analytics_spool()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
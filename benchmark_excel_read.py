@@ -0,0 +1,129 @@
+"""
+효진유통 시스템 - 엑셀 읽기 벤치마크
+
+플레이오토 주문 엑셀 형식의 가상 데이터(기본 5만 행)를 만들어
+엔진별(calamine / openpyxl / xlrd) 읽기 시간과 컬럼 지정 읽기(usecols) 시간을 비교
+
+사용법:
+  python benchmark_excel_read.py
+  python benchmark_excel_read.py --rows 100000 --repeat 3
+
+옵션:
+  --rows    생성할 주문 행 수 (기본 50000)
+  --repeat  엔진별 반복 측정 횟수 (기본 1, 최솟값 출력)
+  --keep    생성한 엑셀 파일 경로 출력 후 삭제하지 않음
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+SITES = ['쿠팡', '스마트스토어', '11번가', 'G마켓', '옥션', '토스쇼핑']
+PRODUCTS = [
+    ('꽃샘', '꽃샘 꿀유자차S 2kg 1개 대용량'),
+    ('꽃샘', '꽃샘 밤 티라미수 라떼 1kg'),
+    ('백제', '백제 쌀국수 멸치맛 10개 선물세트'),
+    ('쟈뎅', '쟈뎅 까페리얼 아메리카노 헤이즐넛 400ml 40개'),
+    ('카페베네', '카페베네 마노 콜롬비아 마일드 아메리카노 180개입 2개'),
+    ('담터', '담터 생강차 플러스 100개입 1개'),
+    ('희창', '희창 자연생각 매실차 원액 980ml 15개입 (1박스)'),
+]
+OPTIONS = ['', '1개', '2개', '단일상품', '92g 10개']
+WARNINGS = ['', '', '', '판매자 스타배송 주문입니다', '주소 확인 필요']
+
+
+def make_playauto_export(rows, seed=42):
+    """플레이오토 주문 엑셀 형식의 가상 데이터 생성"""
+    rnd = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    records = []
+    for i in range(rows):
+        _, product = rnd.choice(PRODUCTS)
+        order_time = start + timedelta(minutes=rnd.randint(0, 60 * 24 * 90))
+        records.append({
+            '주문고유번호': f"{2026000000 + rnd.randint(0, rows)}",
+            '판매사이트명': rnd.choice(SITES),
+            '주문일': order_time.strftime('%Y-%m-%d %H:%M:%S'),
+            '상품명': product,
+            '주문선택사항': rnd.choice(OPTIONS),
+            '주문수량': rnd.choice([1, 1, 1, 2, 3]),
+            '판매가': rnd.randrange(5000, 60000, 100),
+            '배송비금액': rnd.choice([0, 0, 3000]),
+            '구매자명': f"구매자{rnd.randint(1, rows // 3)}",
+            '구매자휴대폰번호': f"010-{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}",
+            '수령자명': f"수령자{rnd.randint(1, rows // 3)}",
+            '배송지주소': f"서울특별시 강남구 테헤란로 {rnd.randint(1, 500)}",
+            '주의메세지': rnd.choice(WARNINGS),
+        })
+    return pd.DataFrame(records)
+
+
+def engine_available(engine):
+    modules = {'calamine': 'python_calamine', 'openpyxl': 'openpyxl', 'xlrd': 'xlrd'}
+    return importlib.util.find_spec(modules[engine]) is not None
+
+
+def time_read(path, engine, repeat, usecols=None):
+    """최소 소요 시간(초)과 읽은 DataFrame 크기 반환"""
+    best = None
+    shape = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = pd.read_excel(path, engine=engine, usecols=usecols)
+        elapsed = time.perf_counter() - start
+        shape = df.shape
+        best = elapsed if best is None else min(best, elapsed)
+    return best, shape
+
+
+def main():
+    parser = argparse.ArgumentParser(description='엑셀 읽기 엔진 벤치마크')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--keep', action='store_true')
+    args = parser.parse_args()
+
+    print(f"\n📦 가상 주문 데이터 {args.rows:,}행 생성...")
+    df = make_playauto_export(args.rows)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    start = time.perf_counter()
+    df.to_excel(path, index=False, engine='openpyxl')
+    print(f"   xlsx 저장 {time.perf_counter() - start:.2f}s ({os.path.getsize(path) / 1024 / 1024:.1f}MB)")
+
+    star_col = lambda col: '주의' in str(col) and '메' in str(col)
+
+    print("\n⏱️  읽기 시간 (xlsx)")
+    print(f"   {'엔진':<10} {'전체 컬럼':>10} {'주의메세지만':>12}")
+    results = {}
+    for engine in ['calamine', 'openpyxl']:
+        if not engine_available(engine):
+            print(f"   {engine:<10} {'(미설치)':>10}")
+            continue
+        try:
+            full, shape = time_read(path, engine, args.repeat)
+            projected, _ = time_read(path, engine, args.repeat, usecols=star_col)
+        except Exception as e:
+            print(f"   {engine:<10} 실패: {e}")
+            continue
+        results[engine] = full
+        print(f"   {engine:<10} {full:>9.2f}s {projected:>11.2f}s   {shape}")
+
+    if 'calamine' in results and 'openpyxl' in results:
+        print(f"\n✅ calamine이 openpyxl 대비 {results['openpyxl'] / results['calamine']:.1f}배 빠름")
+
+    if args.keep:
+        print(f"\n📄 파일 유지: {path}")
+    else:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -215,6 +215,74 @@ ALTER TABLE box_inventory ENABLE ROW LEVEL SECURITY;
 DROP POLICY IF EXISTS "Allow all for box_inventory" ON box_inventory;
 CREATE POLICY "Allow all for box_inventory" ON box_inventory FOR ALL USING (true) WITH CHECK (true);
 
+-- 박스 재고 일괄 저장 (/api/box-inventory POST) - 버전 확인/수정/추가를 한 트랜잭션으로
+-- p_unchanged: 서버 캐시상 변경 없는 행 - p_expected_version(행 수, 최대 id, 최근 수정시각)이 지금 DB와 다르면 함께 저장
+-- 반환: {"rows": 저장된 행, "version": 저장 후 버전, "stale": 버전이 달랐는지}
+DROP FUNCTION IF EXISTS save_box_inventory(JSONB, JSONB);
+CREATE OR REPLACE FUNCTION save_box_inventory(p_inserts JSONB, p_updates JSONB,
+                                              p_unchanged JSONB DEFAULT '[]'::jsonb,
+                                              p_expected_version JSONB DEFAULT NULL)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_stale BOOLEAN;
+    v_updates JSONB := COALESCE(p_updates, '[]'::jsonb);
+    v_rows JSONB;
+    v_version JSONB;
+BEGIN
+    -- 버전 확인과 저장 사이에 다른 저장이 끼어들지 않게
+    LOCK TABLE box_inventory IN SHARE ROW EXCLUSIVE MODE;
+
+    SELECT COALESCE(
+        p_expected_version IS NULL
+        OR jsonb_typeof(p_expected_version) <> 'array'
+        OR COUNT(*) <> (p_expected_version->>0)::BIGINT
+        OR MAX(id) IS DISTINCT FROM (p_expected_version->>1)::INTEGER
+        OR MAX(updated_at) IS DISTINCT FROM (p_expected_version->>2)::TIMESTAMPTZ,
+        TRUE)
+    INTO v_stale
+    FROM box_inventory;
+
+    IF v_stale THEN
+        v_updates := v_updates || COALESCE(p_unchanged, '[]'::jsonb);
+    END IF;
+
+    WITH updated AS (
+        UPDATE box_inventory b SET
+            name_cj = u.name_cj, name_box4u = u.name_box4u, name_official = u.name_official,
+            spec = u.spec, material = u.material, strength = u.strength, print_type = u.print_type,
+            price = u.price, vendor = u.vendor, moq_pallet = u.moq_pallet, moq_piece = u.moq_piece,
+            stock_cj = u.stock_cj, stock_hyojin = u.stock_hyojin, purpose = u.purpose,
+            updated_at = NOW()
+        FROM jsonb_to_recordset(v_updates) AS u(
+            id INTEGER, name_cj TEXT, name_box4u TEXT, name_official TEXT, spec TEXT, material TEXT, strength TEXT,
+            print_type TEXT, price INTEGER, vendor TEXT, moq_pallet INTEGER, moq_piece INTEGER,
+            stock_cj NUMERIC, stock_hyojin NUMERIC, purpose TEXT
+        )
+        WHERE b.id = u.id
+        RETURNING b.*
+    ), inserted AS (
+        INSERT INTO box_inventory (name_cj, name_box4u, name_official, spec, material, strength, print_type,
+                                   price, vendor, moq_pallet, moq_piece, stock_cj, stock_hyojin, purpose, updated_at)
+        SELECT i.name_cj, i.name_box4u, i.name_official, i.spec, i.material, i.strength, i.print_type,
+               i.price, i.vendor, i.moq_pallet, i.moq_piece, i.stock_cj, i.stock_hyojin, i.purpose, NOW()
+        FROM jsonb_to_recordset(COALESCE(p_inserts, '[]'::jsonb)) AS i(
+            name_cj TEXT, name_box4u TEXT, name_official TEXT, spec TEXT, material TEXT, strength TEXT,
+            print_type TEXT, price INTEGER, vendor TEXT, moq_pallet INTEGER, moq_piece INTEGER,
+            stock_cj NUMERIC, stock_hyojin NUMERIC, purpose TEXT
+        )
+        RETURNING *
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(s)), '[]'::jsonb) INTO v_rows
+    FROM (SELECT * FROM updated UNION ALL SELECT * FROM inserted) s;
+
+    SELECT jsonb_build_array(COUNT(*), MAX(id), MAX(updated_at)) INTO v_version FROM box_inventory;
+
+    RETURN jsonb_build_object('rows', v_rows, 'version', v_version, 'stale', v_stale);
+END;
+$$;
+
 -- =============================================
 -- 데이터 분석 테이블
 -- =============================================
@@ -238,10 +306,69 @@ CREATE TABLE IF NOT EXISTS customers (
 CREATE INDEX IF NOT EXISTS idx_customers_휴대폰번호 ON customers(휴대폰번호);
 CREATE INDEX IF NOT EXISTS idx_customers_총주문횟수 ON customers(총주문횟수);
 
+-- 고객 목록 정렬/키셋 페이지네이션용 (정렬 컬럼, id) 인덱스
+CREATE INDEX IF NOT EXISTS idx_customers_총주문횟수_id ON customers(총주문횟수, id);
+CREATE INDEX IF NOT EXISTS idx_customers_총구매금액_id ON customers(총구매금액, id);
+CREATE INDEX IF NOT EXISTS idx_customers_선물발송횟수_id ON customers(선물발송횟수, id);
+CREATE INDEX IF NOT EXISTS idx_customers_최근구매일_id ON customers(최근구매일, id);
+CREATE INDEX IF NOT EXISTS idx_customers_첫구매일_id ON customers(첫구매일, id);
+CREATE INDEX IF NOT EXISTS idx_customers_구매자명_id ON customers(구매자명, id);
+CREATE INDEX IF NOT EXISTS idx_customers_휴대폰번호_id ON customers(휴대폰번호, id);
+
+-- 고객 검색(ilike '%검색어%')용 trigram 인덱스 (pg_trgm은 아래 원가 마진표 검색에서도 사용)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_customers_휴대폰번호_trgm ON customers USING gin (휴대폰번호 gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_구매자명_trgm ON customers USING gin (구매자명 gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_주요배송지_trgm ON customers USING gin (주요배송지 gin_trgm_ops);
+
 ALTER TABLE customers ENABLE ROW LEVEL SECURITY;
 DROP POLICY IF EXISTS "Allow all for customers" ON customers;
 CREATE POLICY "Allow all for customers" ON customers FOR ALL USING (true) WITH CHECK (true);
 
+-- 고객 통계를 반영한 업로드 배치 (같은 배치를 다시 반영해도 두 번 누적되지 않게)
+CREATE TABLE IF NOT EXISTS customer_batches (
+    upload_batch_id TEXT PRIMARY KEY,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE customer_batches ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for customer_batches" ON customer_batches;
+CREATE POLICY "Allow all for customer_batches" ON customer_batches FOR ALL USING (true) WITH CHECK (true);
+
+-- 업로드 배치의 고객 통계 누적 (판매 데이터 저장 시) - 배치 기록과 누적 upsert를 한 트랜잭션으로
+-- p_customers: [{"휴대폰번호", "구매자명", "구매자ID", "주문일", "주문수", "총금액", "선물수", "주소"}, ...]
+-- 이미 반영한 배치면 아무것도 바꾸지 않고 FALSE 반환
+CREATE OR REPLACE FUNCTION apply_customer_batch(p_batch_id TEXT, p_customers JSONB)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO customer_batches (upload_batch_id) VALUES (p_batch_id)
+    ON CONFLICT (upload_batch_id) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO customers AS c (휴대폰번호, 구매자명, "구매자ID", 첫구매일, 최근구매일,
+                                총주문횟수, 총구매금액, 선물발송횟수, 주요배송지)
+    SELECT n.휴대폰번호, n.구매자명, n."구매자ID", n.주문일, n.주문일, n.주문수, n.총금액, n.선물수, n.주소
+    FROM jsonb_to_recordset(COALESCE(p_customers, '[]'::jsonb)) AS n(
+        휴대폰번호 TEXT, 구매자명 TEXT, "구매자ID" TEXT, 주문일 TIMESTAMPTZ,
+        주문수 INTEGER, 총금액 NUMERIC, 선물수 INTEGER, 주소 TEXT
+    )
+    ON CONFLICT (휴대폰번호) DO UPDATE SET
+        구매자명 = COALESCE(NULLIF(EXCLUDED.구매자명, ''), c.구매자명),
+        "구매자ID" = COALESCE(NULLIF(EXCLUDED."구매자ID", ''), c."구매자ID"),
+        최근구매일 = EXCLUDED.최근구매일,
+        총주문횟수 = COALESCE(c.총주문횟수, 0) + EXCLUDED.총주문횟수,
+        총구매금액 = COALESCE(c.총구매금액, 0) + EXCLUDED.총구매금액,
+        선물발송횟수 = COALESCE(c.선물발송횟수, 0) + EXCLUDED.선물발송횟수,
+        주요배송지 = COALESCE(NULLIF(EXCLUDED.주요배송지, ''), c.주요배송지),
+        updated_at = NOW();
+    RETURN TRUE;
+END;
+$$;
+
 -- 11. 판매 데이터 테이블
 CREATE TABLE IF NOT EXISTS sales_data (
     id SERIAL PRIMARY KEY,
@@ -286,3 +413,279 @@ ALTER TABLE sales_data ADD COLUMN IF NOT EXISTS 주문번호 TEXT;
 
 -- 인덱스 추가 (중복 체크 성능 향상)
 CREATE INDEX IF NOT EXISTS idx_sales_data_주문번호 ON sales_data(주문번호);
+
+-- =============================================
+-- 원가 마진표 검색
+-- =============================================
+
+-- 12. 원가 마진표 테이블 (migrate_to_supabase.py로 margin_data.json에서 이전)
+CREATE TABLE IF NOT EXISTS margin_products (
+    id SERIAL PRIMARY KEY,
+    상품명 TEXT UNIQUE NOT NULL,
+    인상전_상품가 NUMERIC DEFAULT 0,
+    인상후_상품가 NUMERIC DEFAULT 0,
+    물량지원 NUMERIC DEFAULT 1,
+    프로모션할인률 NUMERIC DEFAULT 0,
+    장려금률 NUMERIC DEFAULT 0,
+    배송비 NUMERIC DEFAULT 0,
+    박스비 NUMERIC DEFAULT 0,
+    인상전_총_원가 NUMERIC DEFAULT 0,
+    인상후_총_원가 NUMERIC DEFAULT 0,
+    인상전_재고 TEXT DEFAULT '',
+    박스_최대_수량 TEXT DEFAULT '',
+    기타사항 TEXT DEFAULT '',
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE margin_products ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for margin_products" ON margin_products;
+CREATE POLICY "Allow all for margin_products" ON margin_products FOR ALL USING (true) WITH CHECK (true);
+
+-- 상품명 부분 검색(ilike '%검색어%')용 trigram 인덱스 (pg_trgm은 위 고객 테이블에서 생성)
+CREATE INDEX IF NOT EXISTS idx_margin_products_상품명_trgm ON margin_products USING gin (상품명 gin_trgm_ops);
+
+-- =============================================
+-- 데이터 분석 집계 함수
+-- =============================================
+
+-- KPI 요약 (/api/analytics/summary) - 매출/순이익 합계, 고유 주문번호 수, 행 수를 한 행으로 반환
+-- p_start 이상, p_end 미만 (NULL이면 제한 없음)
+CREATE OR REPLACE FUNCTION analytics_summary(p_start TIMESTAMPTZ DEFAULT NULL, p_end TIMESTAMPTZ DEFAULT NULL)
+RETURNS TABLE (total_revenue NUMERIC, total_profit NUMERIC, unique_orders BIGINT, row_count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        COALESCE(SUM(COALESCE(판매가, 0) + COALESCE(배송비금액, 0)), 0),
+        COALESCE(SUM(COALESCE(순이익, 0)), 0),
+        COUNT(DISTINCT NULLIF(주문번호, '')),
+        COUNT(*)
+    FROM sales_data
+    WHERE (p_start IS NULL OR 주문일 >= p_start)
+      AND (p_end IS NULL OR 주문일 < p_end);
+$$;
+
+-- 고객 통계 재계산 (배치 삭제 후 해당 고객만) - 휴대폰번호별 한 행
+-- 주문 수: 고유 주문번호 + 주문번호 없는 행, 주요배송지: 가장 최근 주문의 배송지 (주문일이 없으면 첫 행)
+CREATE OR REPLACE FUNCTION customer_stats(p_phones TEXT[])
+RETURNS TABLE (
+    휴대폰번호 TEXT, 구매자명 TEXT, "구매자ID" TEXT, 총주문횟수 BIGINT, 총구매금액 NUMERIC,
+    선물발송횟수 BIGINT, 최근구매일 TIMESTAMPTZ, 첫구매일 TIMESTAMPTZ, 주요배송지 TEXT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        s.구매자휴대폰번호,
+        (ARRAY_AGG(s.구매자명 ORDER BY s.id))[1],
+        (ARRAY_AGG(s."구매자ID" ORDER BY s.id))[1],
+        COUNT(DISTINCT NULLIF(s.주문번호, '')) + COUNT(*) FILTER (WHERE COALESCE(s.주문번호, '') = ''),
+        COALESCE(SUM(COALESCE(s.판매가, 0) + COALESCE(s.배송비금액, 0)), 0),
+        COUNT(*) FILTER (WHERE s.is_gift),
+        MAX(s.주문일),
+        MIN(s.주문일),
+        (ARRAY_AGG(s.배송지주소 ORDER BY s.주문일 DESC NULLS LAST, s.id))[1]
+    FROM sales_data s
+    WHERE s.구매자휴대폰번호 = ANY(p_phones)
+    GROUP BY s.구매자휴대폰번호;
+$$;
+
+-- =============================================
+-- 판매 데이터 일별 집계 (롤업)
+-- =============================================
+-- 판매 데이터 저장 시 더하고 배치 삭제 시 빼서 유지 (apply_sales_rollups)
+-- sale_date: 주문일의 UTC 날짜, 주문일이 없으면 NULL
+-- 최초 적용/불일치 시 POST /api/analytics/rollups/rebuild 로 재생성
+
+-- 날짜 × 판매사이트
+CREATE TABLE IF NOT EXISTS sales_rollup_daily_platform (
+    id BIGSERIAL PRIMARY KEY,
+    sale_date DATE,
+    platform TEXT NOT NULL,
+    quantity BIGINT DEFAULT 0,
+    revenue NUMERIC DEFAULT 0,
+    profit NUMERIC DEFAULT 0,
+    row_count BIGINT DEFAULT 0,
+    order_count BIGINT DEFAULT 0,  -- 주문 수 (주문번호별로 첫 주문 날짜에만 셈 - 여러 날짜를 더해도 중복 없음)
+    UNIQUE NULLS NOT DISTINCT (sale_date, platform)
+);
+
+-- 날짜 × 상품/옵션 × 플랫폼(간소화)
+CREATE TABLE IF NOT EXISTS sales_rollup_daily_product (
+    id BIGSERIAL PRIMARY KEY,
+    sale_date DATE,
+    product TEXT NOT NULL,
+    option TEXT NOT NULL DEFAULT '',
+    platform_group TEXT NOT NULL,
+    quantity BIGINT DEFAULT 0,
+    revenue NUMERIC DEFAULT 0,
+    row_count BIGINT DEFAULT 0,
+    UNIQUE NULLS NOT DISTINCT (sale_date, product, option, platform_group)
+);
+
+-- 날짜 × 요일 × 시간 (주문일 있는 행만)
+CREATE TABLE IF NOT EXISTS sales_rollup_daily_hourly (
+    id BIGSERIAL PRIMARY KEY,
+    sale_date DATE,
+    weekday SMALLINT NOT NULL,
+    hour SMALLINT NOT NULL,
+    quantity BIGINT DEFAULT 0,
+    revenue NUMERIC DEFAULT 0,
+    row_count BIGINT DEFAULT 0,
+    UNIQUE NULLS NOT DISTINCT (sale_date, weekday, hour)
+);
+
+-- 날짜 × 지역 (배송지주소 앞 두 단어)
+CREATE TABLE IF NOT EXISTS sales_rollup_daily_region (
+    id BIGSERIAL PRIMARY KEY,
+    sale_date DATE,
+    region TEXT NOT NULL,
+    quantity BIGINT DEFAULT 0,
+    revenue NUMERIC DEFAULT 0,
+    row_count BIGINT DEFAULT 0,
+    UNIQUE NULLS NOT DISTINCT (sale_date, region)
+);
+
+ALTER TABLE sales_rollup_daily_platform ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for sales_rollup_daily_platform" ON sales_rollup_daily_platform;
+CREATE POLICY "Allow all for sales_rollup_daily_platform" ON sales_rollup_daily_platform FOR ALL USING (true) WITH CHECK (true);
+
+ALTER TABLE sales_rollup_daily_product ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for sales_rollup_daily_product" ON sales_rollup_daily_product;
+CREATE POLICY "Allow all for sales_rollup_daily_product" ON sales_rollup_daily_product FOR ALL USING (true) WITH CHECK (true);
+
+ALTER TABLE sales_rollup_daily_hourly ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for sales_rollup_daily_hourly" ON sales_rollup_daily_hourly;
+CREATE POLICY "Allow all for sales_rollup_daily_hourly" ON sales_rollup_daily_hourly FOR ALL USING (true) WITH CHECK (true);
+
+ALTER TABLE sales_rollup_daily_region ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for sales_rollup_daily_region" ON sales_rollup_daily_region;
+CREATE POLICY "Allow all for sales_rollup_daily_region" ON sales_rollup_daily_region FOR ALL USING (true) WITH CHECK (true);
+
+-- 롤업 증감 반영 - p_deltas: {"platform": [...], "product": [...], "hourly": [...], "region": [...]}
+-- 빼기는 음수 값으로 전달, 행 수가 0 이하가 된 버킷은 삭제
+CREATE OR REPLACE FUNCTION apply_sales_rollups(p_deltas JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO sales_rollup_daily_platform AS r (sale_date, platform, quantity, revenue, profit, row_count, order_count)
+    SELECT t.sale_date, t.platform, t.quantity, t.revenue, t.profit, t.row_count, t.order_count
+    FROM jsonb_to_recordset(COALESCE(p_deltas->'platform', '[]'::jsonb))
+        AS t(sale_date DATE, platform TEXT, quantity BIGINT, revenue NUMERIC, profit NUMERIC, row_count BIGINT, order_count BIGINT)
+    ON CONFLICT (sale_date, platform) DO UPDATE SET
+        quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue,
+        profit = r.profit + EXCLUDED.profit,
+        row_count = r.row_count + EXCLUDED.row_count,
+        order_count = r.order_count + EXCLUDED.order_count;
+
+    INSERT INTO sales_rollup_daily_product AS r (sale_date, product, option, platform_group, quantity, revenue, row_count)
+    SELECT t.sale_date, t.product, t.option, t.platform_group, t.quantity, t.revenue, t.row_count
+    FROM jsonb_to_recordset(COALESCE(p_deltas->'product', '[]'::jsonb))
+        AS t(sale_date DATE, product TEXT, option TEXT, platform_group TEXT, quantity BIGINT, revenue NUMERIC, row_count BIGINT)
+    ON CONFLICT (sale_date, product, option, platform_group) DO UPDATE SET
+        quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue,
+        row_count = r.row_count + EXCLUDED.row_count;
+
+    INSERT INTO sales_rollup_daily_hourly AS r (sale_date, weekday, hour, quantity, revenue, row_count)
+    SELECT t.sale_date, t.weekday, t.hour, t.quantity, t.revenue, t.row_count
+    FROM jsonb_to_recordset(COALESCE(p_deltas->'hourly', '[]'::jsonb))
+        AS t(sale_date DATE, weekday SMALLINT, hour SMALLINT, quantity BIGINT, revenue NUMERIC, row_count BIGINT)
+    ON CONFLICT (sale_date, weekday, hour) DO UPDATE SET
+        quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue,
+        row_count = r.row_count + EXCLUDED.row_count;
+
+    INSERT INTO sales_rollup_daily_region AS r (sale_date, region, quantity, revenue, row_count)
+    SELECT t.sale_date, t.region, t.quantity, t.revenue, t.row_count
+    FROM jsonb_to_recordset(COALESCE(p_deltas->'region', '[]'::jsonb))
+        AS t(sale_date DATE, region TEXT, quantity BIGINT, revenue NUMERIC, row_count BIGINT)
+    ON CONFLICT (sale_date, region) DO UPDATE SET
+        quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue,
+        row_count = r.row_count + EXCLUDED.row_count;
+
+    DELETE FROM sales_rollup_daily_platform WHERE row_count <= 0;
+    DELETE FROM sales_rollup_daily_product WHERE row_count <= 0;
+    DELETE FROM sales_rollup_daily_hourly WHERE row_count <= 0;
+    DELETE FROM sales_rollup_daily_region WHERE row_count <= 0;
+END;
+$$;
+
+-- 롤업 전체 재생성 (POST /api/analytics/rollups/rebuild) - 비우기와 다시 채우기를 한 트랜잭션으로
+-- p_rows: apply_sales_rollups와 같은 형식의 전체 롤업 행
+CREATE OR REPLACE FUNCTION replace_sales_rollups(p_rows JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM sales_rollup_daily_platform WHERE true;
+    DELETE FROM sales_rollup_daily_product WHERE true;
+    DELETE FROM sales_rollup_daily_hourly WHERE true;
+    DELETE FROM sales_rollup_daily_region WHERE true;
+    PERFORM apply_sales_rollups(p_rows);
+END;
+$$;
+
+-- 롤업 사용 가능 여부 확인용 - 종류별 행 수 합계 + 날짜 있는 플랫폼 롤업 행 수 (platform_dated)
+CREATE OR REPLACE FUNCTION sales_rollup_totals()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'platform', (SELECT COALESCE(SUM(row_count), 0)::BIGINT FROM sales_rollup_daily_platform),
+        'platform_dated', (SELECT COALESCE(SUM(row_count), 0)::BIGINT FROM sales_rollup_daily_platform WHERE sale_date IS NOT NULL),
+        'product', (SELECT COALESCE(SUM(row_count), 0)::BIGINT FROM sales_rollup_daily_product),
+        'hourly', (SELECT COALESCE(SUM(row_count), 0)::BIGINT FROM sales_rollup_daily_hourly),
+        'region', (SELECT COALESCE(SUM(row_count), 0)::BIGINT FROM sales_rollup_daily_region)
+    );
+$$;
+
+-- =============================================
+-- 담당자 상품 규칙 수
+-- =============================================
+
+-- 13. 담당자 테이블 (migrate_to_supabase.py로 playauto_settings_v4.json에서 이전)
+CREATE TABLE IF NOT EXISTS workers (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    type TEXT DEFAULT 'product_specific',
+    description TEXT DEFAULT '',
+    icon TEXT DEFAULT '📋',
+    enabled BOOLEAN DEFAULT TRUE,
+    sort_order INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 14. 담당자 상품 규칙 테이블
+CREATE TABLE IF NOT EXISTS worker_products (
+    id SERIAL PRIMARY KEY,
+    worker_id INTEGER REFERENCES workers(id) ON DELETE CASCADE,
+    brand TEXT DEFAULT '',
+    product_name TEXT DEFAULT '',
+    order_option TEXT DEFAULT 'All',
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE workers ENABLE ROW LEVEL SECURITY;
+ALTER TABLE worker_products ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow all for workers" ON workers;
+DROP POLICY IF EXISTS "Allow all for worker_products" ON worker_products;
+CREATE POLICY "Allow all for workers" ON workers FOR ALL USING (true) WITH CHECK (true);
+CREATE POLICY "Allow all for worker_products" ON worker_products FOR ALL USING (true) WITH CHECK (true);
+
+-- 담당자 목록(/api/workers)을 상품 규칙 수와 함께 한 번에 조회
+CREATE INDEX IF NOT EXISTS idx_worker_products_worker_id ON worker_products(worker_id);
+
+CREATE OR REPLACE VIEW workers_with_product_count AS
+SELECT w.*, COALESCE(c.product_count, 0) AS product_count
+FROM workers w
+LEFT JOIN (
+    SELECT worker_id, COUNT(*) AS product_count
+    FROM worker_products
+    GROUP BY worker_id
+) c ON c.worker_id = w.id;